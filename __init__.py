@@ -1,31 +1,48 @@
 #!/usr/bin/python3
 
 import logging
+from importlib import import_module
 
-from .tools import (
-                    WatchList, 
-                    scan, 
-                    LP,
-                    Model, 
-                    DataBases,  
-                    ATP,
-                    HidePrints
-                        )
-from .core import (
-                BuildNest,
-                Inputs, 
-                read_yaml, 
-                read_json,
-                pick,
-                Nest,
-                Community
-                    )
-from .nest import (
-                get_path, 
-                check_egg_exists, 
-                Eggs, 
-                hatch
-                    )
+# Attributes are imported from their modules on first use (PEP 562), so importing tuatara
+# for a headless build (see __main__.py) never loads ScrumPy, tkinter or the plotting libraries.
+_exports = {
+    "WatchList" :           ".tools",
+    "scan" :                ".tools",
+    "LP" :                  ".tools",
+    "Model" :               ".tools",
+    "DataBases" :           ".tools",
+    "ATP" :                 ".tools",
+    "HidePrints" :          ".tools",
+    "BuildNest" :           ".core",
+    "Inputs" :              ".core",
+    "read_yaml" :           ".core",
+    "read_json" :           ".core",
+    "pick" :                ".core",
+    "Nest" :                ".core",
+    "Community" :           ".core",
+    "merge_shards" :        ".core",
+    "get_path" :            ".nest",
+    "check_egg_exists" :    ".nest",
+    "Eggs" :                ".nest",
+    "hatch" :               ".nest",
+    "hatch_many" :          ".nest",
+    "DeltaModel" :          ".nest",
+    "egg_cache" :           ".nest"
+}
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
 
 
 # TODO: Does a more robust egg storage system need to be included?
@@ -48,6 +65,8 @@ def debug():
     logging.getLogger().setLevel(logging.DEBUG)
 
 
+__all__ = [*_exports, "verbose", "debug"]
+
 __version__ = "0.1-dev"
 
 __doc__ = f"""
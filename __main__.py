@@ -0,0 +1,162 @@
+"""
+Command line interface for tuatara.
+
+Builds a nest without an interactive session, for example on a batch server:
+
+    python -m tuatara build config.yaml --workers 8 --egg-dir /data/eggs
+
+A nest can be split across machines sharing the egg and checkpoint directories, with
+one build per shard, and the exported reports of the shards merged afterwards:
+
+    python -m tuatara build config.yaml --shard 0/4 --export shard0.json ...
+    python -m tuatara merge shard0.json shard1.json shard2.json shard3.json --output nest.json
+
+Progress is written to stdout as JSON lines, one object per event:
+
+    {"event": "start", ...}                                     build options
+    {"event": "stage", "name": ..., "wall": ..., "cpu": ..., "peak": ...}
+    {"event": "egg", "name": ..., "wall": ..., "cpu": ..., "peak": ...}
+    {"event": "done", "eggs": ..., "skipped": ..., "aliases": ..., "wall": ..., "cpu": ...}
+    {"event": "merged", "shards": ..., "eggs": ..., "skipped": ..., "aliases": ..., "wall": ..., "cpu": ...}
+    {"event": "error", "type": ..., "message": ...}
+
+Wall and CPU times are in seconds and peak memory in bytes (null unless --profile-memory).
+Log messages are written to stderr. Model files are looked for in the current working directory.
+
+Only the modules needed to build a nest are imported (no ScrumPy models, tkinter or plotting libraries).
+
+"""
+
+
+import argparse
+import json
+import logging
+import sys
+from os import path
+
+from .core.Builder import BuildNest
+from .core.InputHandler import read_json, read_yaml
+from .core.shards import merge_shards
+
+
+def _emit(event, **fields):
+    print(json.dumps({"event" : event, **fields}), flush=True)
+
+
+def _on_profile(kind, name, record):
+    _emit(kind, name=name, **record)
+
+
+def _read_inputs(fp):
+    if fp.endswith(".json"):
+        return read_json(fp)
+    return read_yaml(fp)
+
+
+def build(args):
+    """Builds a nest from a YAML or JSON config file and reports progress as JSON lines."""
+    if not path.isfile(args.config):
+        raise FileNotFoundError(f"Config file not found: {args.config}")
+
+    inputs = _read_inputs(args.config)
+    _emit("start",
+        config=path.abspath(args.config),
+        workers=args.workers,
+        egg_dir=args.egg_dir,
+        cache_dir=args.cache_dir,
+        resume=args.resume,
+        shard=args.shard)
+
+    nest = BuildNest(
+        inputs,
+        workers=args.workers,
+        cache_dir=False if args.no_cache else args.cache_dir,
+        incremental=args.incremental,
+        dedupe=args.dedupe,
+        compress=args.compress,
+        compile=args.compile,
+        egg_dir=args.egg_dir,
+        checkpoint_dir=False if args.no_checkpoint else args.checkpoint_dir,
+        resume=args.resume,
+        shard=args.shard,
+        profile_memory=args.profile_memory,
+        on_profile=_on_profile)
+
+    if args.profile:
+        nest.profile.to_json(args.profile)
+    if args.export:
+        nest.export(args.export)
+
+    total = nest.profile.report()["total"]
+    _emit("done",
+        eggs=len(nest.eggs),
+        skipped=len(nest.skipped),
+        aliases=len(nest.aliases),
+        **total)
+
+
+def merge(args):
+    """Merges the exported reports of each shard of a build."""
+    merged = merge_shards(args.reports)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(merged, f, indent=4)
+
+    _emit("merged",
+        shards=len(merged["shards"]),
+        eggs=len(merged["eggs"]),
+        skipped=len(merged["skipped"]),
+        aliases=len(merged["aliases"]),
+        **merged["profile"]["total"])
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m tuatara",
+        description="tuatara - a metabolic model modularisation package for ScrumPy")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_build = commands.add_parser("build", help="build a nest of eggs from a YAML or JSON config file")
+    parser_build.add_argument("config", help="YAML (or .json) file of inputs, as read by read_yaml/read_json")
+    parser_build.add_argument("--workers", type=int, default=1, help="processes used to parse databases and write eggs (default: 1)")
+    parser_build.add_argument("--cache-dir", default=None, help="directory for cached database reactions (default: tuatara/core/cache)")
+    parser_build.add_argument("--no-cache", action="store_true", help="always parse databases with PyoCyc")
+    parser_build.add_argument("--egg-dir", default=None, help="directory to write eggs to (default: tuatara/nest/eggs)")
+    parser_build.add_argument("--checkpoint-dir", default=None, help="save build checkpoints to this directory (default: none, or tuatara/core/checkpoints with --resume or --shard)")
+    parser_build.add_argument("--no-checkpoint", action="store_true", help="don't save checkpoints")
+    parser_build.add_argument("--resume", action="store_true", help="continue an interrupted build from its checkpoint, saving one if there is none")
+    parser_build.add_argument("--shard", metavar="I/N", default=None, help="only write the eggs of shard I of N (I from 0 to N-1)")
+    parser_build.add_argument("--export", metavar="FILE", default=None, help="write the egg statements and profile to FILE as JSON, for merge")
+    parser_build.add_argument("--incremental", action="store_true", help="skip eggs whose inputs are unchanged")
+    parser_build.add_argument("--dedupe", action="store_true", help="store eggs with identical gene profiles as aliases")
+    parser_build.add_argument("--compress", action="store_true", help="write eggs as .spy.gz files")
+    parser_build.add_argument("--compile", action="store_true", help="also write compiled eggs (.spyc) for fast hatching")
+    parser_build.add_argument("--profile", metavar="FILE", default=None, help="write the build profile to FILE as JSON")
+    parser_build.add_argument("--profile-memory", action="store_true", help="record peak memory of each stage and egg (slow)")
+    parser_build.add_argument("--quiet", action="store_true", help="only log errors")
+    parser_build.set_defaults(func=build)
+
+    parser_merge = commands.add_parser("merge", help="merge the exported reports of each shard of a build")
+    parser_merge.add_argument("reports", nargs="+", help="JSON reports written by build --export")
+    parser_merge.add_argument("--output", metavar="FILE", default=None, help="write the merged report to FILE as JSON")
+    parser_merge.add_argument("--quiet", action="store_true", help="only log errors")
+    parser_merge.set_defaults(func=merge)
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    logging.basicConfig(stream=sys.stderr, format="tuatara - %(levelname)s - %(message)s")        # no-op if importing tuatara already added the handler
+    logging.getLogger().setLevel(logging.ERROR if args.quiet else logging.INFO)
+
+    try:
+        args.func(args)
+    except Exception as error:
+        logging.getLogger(__name__).exception("Build failed")
+        _emit("error", type=type(error).__name__, message=str(error))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,266 @@
+"""
+Benchmark suite for building and hatching a nest.
+
+Builds a nest from synthetic inputs (see synthetic.py) and records the wall time of each
+BuildNest stage (from BuildNest.profile) and of hatching eggs: parsed, from the egg cache
+and from compiled eggs, and with hatch_many (as DeltaModels, and materialised). Each measurement is the fastest of --repeat runs. Results are
+compared with the baseline stored for the same size in baseline.json, and the suite exits
+with status 1 when a measurement is slower than its baseline by more than --tolerance (and
+by at least --min-seconds, so noise in very short stages is ignored).
+
+ScrumPy is not needed: databases are served from the reaction cache written by synthetic.py,
+and eggs are hatched into a stand-in model which stores the reactions it is given. Before
+timing, each run checks that hatch_many gives every egg the same reactions as hatch.
+
+Usage:
+
+    python benchmarks/bench_build.py --size small                  # compare with baseline.json
+    python benchmarks/bench_build.py --size medium --save          # record a new baseline
+    python benchmarks/bench_build.py --genes 50000 --isolates 2000 --databases 8 --no-compare
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from os import path
+
+from synthetic import make_dataset
+
+from tuatara.core.Builder import BuildNest
+from tuatara.core.InputHandler import read_yaml
+from tuatara.nest.cache import egg_cache
+from tuatara.nest.hatcher import _parse_file, compile_egg, hatch, hatch_many
+from tuatara.nest.keeper import get_path
+
+
+BASELINE = path.join(path.dirname(path.realpath(__file__)), "baseline.json")
+
+SIZES = {
+    "small" :   {"genes" : 2000,  "isolates" : 50,   "databases" : 3},
+    "medium" :  {"genes" : 10000, "isolates" : 200,  "databases" : 5},
+    "large" :   {"genes" : 30000, "isolates" : 1000, "databases" : 8}
+    }
+
+
+class StandInModel:
+
+    """
+    The parts of a ScrumPy model used by hatch. As in ScrumPy, DelReactions and NewReaction
+    change the stoichiometry matrices in place and Init rebuilds them from the model's reactions.
+    """
+
+    class _StoMat:
+        def __init__(self, reactions):
+            self.reactions = dict(reactions)
+
+        @property
+        def cnames(self):
+            return list(self.reactions)
+
+        def NewReaction(self, name, StoMat, direction):
+            self.reactions[name] = (StoMat, direction)
+
+    def __init__(self, reactions=()):
+        self._reactions = {name : ({}, "->") for name in reactions}
+        self.Init()
+
+    def DelReactions(self, reactions):
+        for reaction in reactions:
+            self.sm.reactions.pop(reaction, None)
+            self.smx.reactions.pop(reaction, None)
+
+    def Init(self):
+        self.sm = self._StoMat(self._reactions)
+        self.smx = self._StoMat(self._reactions)
+
+
+def stand_in_model(eggs, egg_dir):
+    "A stand-in model holding the reactions the eggs remove."
+    reactions = set()
+    for egg in eggs:
+        reactions.update(_parse_file(get_path(egg, directory=egg_dir))[1])
+    return StandInModel(sorted(reactions))
+
+
+def check_hatch_many(eggs, egg_dir):
+    "Checks hatch_many gives each egg the same reactions as hatching it on its own, before and after materialising."
+    model = stand_in_model(eggs, egg_dir)
+    expected = [hatch(model, egg, egg_dir=egg_dir).sm.cnames for egg in eggs]
+    deltas = hatch_many(model, eggs, egg_dir=egg_dir)
+    if [delta.sm.cnames for delta in deltas] != expected:
+        raise AssertionError("hatch_many and hatch hatched different models")
+    if [delta.materialise().sm.cnames for delta in deltas] != expected:
+        raise AssertionError("materialised models differ from those hatched by hatch")
+
+
+def build(config, egg_dir, workers):
+    "Builds a nest and returns the wall time of each stage."
+    if path.isdir(egg_dir):
+        shutil.rmtree(egg_dir)
+    nest = BuildNest(read_yaml(config),
+        workers=workers,
+        cache_dir=path.join(path.dirname(config), "cache"),
+        checkpoint_dir=False,
+        egg_dir=egg_dir)
+    report = nest.profile.report()
+    timings = {f"build.{name}" : record["wall"] for name, record in report["stages"].items()}
+    timings["build.total"] = report["total"]["wall"]
+    return timings, nest.samples
+
+
+def hatch_eggs(eggs, egg_dir):
+    "Times parsing and hatching eggs, per egg."
+    paths = [get_path(egg, directory=egg_dir) for egg in eggs]
+
+    start = time.perf_counter()
+    for egg_path in paths:
+        _parse_file(egg_path)
+    parse = time.perf_counter() - start
+
+    model = stand_in_model(eggs, egg_dir)
+    egg_cache.clear()
+    start = time.perf_counter()
+    for egg in eggs:
+        hatch(model, egg, egg_dir=egg_dir)
+    total = time.perf_counter() - start
+
+    egg_cache.clear()
+    start = time.perf_counter()
+    hatch_many(model, eggs, egg_dir=egg_dir)
+    many = time.perf_counter() - start
+
+    egg_cache.clear()
+    start = time.perf_counter()
+    for delta in hatch_many(model, eggs, egg_dir=egg_dir):
+        delta.materialise()
+    materialised = time.perf_counter() - start
+
+    start = time.perf_counter()                                                                     # again, from tuatara.egg_cache
+    for egg in eggs:
+        hatch(model, egg, egg_dir=egg_dir)
+    cached = time.perf_counter() - start
+
+    for egg_path in paths:
+        compile_egg(egg_path)
+    egg_cache.clear()
+    start = time.perf_counter()
+    for egg in eggs:
+        hatch(model, egg, egg_dir=egg_dir)
+    compiled = time.perf_counter() - start
+    return {
+        "hatch.parse_file" : parse / len(eggs),
+        "hatch.egg" : total / len(eggs),
+        "hatch.many" : many / len(eggs),
+        "hatch.many_materialised" : materialised / len(eggs),
+        "hatch.egg_cached" : cached / len(eggs),
+        "hatch.egg_compiled" : compiled / len(eggs)
+        }
+
+
+def run(config, repeat, workers, hatched):
+    "Returns the fastest time of each measurement over repeat runs."
+    best = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        egg_dir = path.join(tmp, "eggs")
+        for _ in range(repeat):
+            timings, eggs = build(config, egg_dir, workers)
+            check_hatch_many(eggs[:hatched], egg_dir)
+            timings.update(hatch_eggs(eggs[:hatched], egg_dir))
+            for name, seconds in timings.items():
+                best[name] = min(seconds, best.get(name, seconds))
+    return best
+
+
+def compare(results, baseline, tolerance, min_seconds):
+    "Prints each measurement against its baseline and returns those which regressed."
+    regressions = []
+    print(f"{'measurement':<36}{'baseline (s)':>14}{'current (s)':>14}{'ratio':>8}")
+    for name, seconds in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            print(f"{name:<36}{'-':>14}{seconds:>14.4f}{'-':>8}")
+            continue
+        ratio = seconds / expected if expected else float("inf")
+        regressed = ratio > 1 + tolerance and seconds - expected > min_seconds
+        print(f"{name:<36}{expected:>14.4f}{seconds:>14.4f}{ratio:>8.2f}" + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", choices=SIZES, default="small", help="preset dataset size (default: small)")
+    parser.add_argument("--genes", type=int, help="override the number of genes")
+    parser.add_argument("--isolates", type=int, help="override the number of isolates")
+    parser.add_argument("--databases", type=int, help="override the number of databases")
+    parser.add_argument("--data", help="directory to write the synthetic inputs to and reuse (default: temporary)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the fastest is kept (default: 3)")
+    parser.add_argument("--hatch-eggs", type=int, default=20, help="eggs hatched per run (default: 20)")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline file (default: benchmarks/baseline.json)")
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline for this size")
+    parser.add_argument("--no-compare", action="store_true", help="don't compare with the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (default: 0.25)")
+    parser.add_argument("--min-seconds", type=float, default=0.05, help="ignore slowdowns smaller than this (default: 0.05)")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.ERROR)
+
+    size = dict(SIZES[args.size])
+    size.update({key : value for key, value in vars(args).items() if key in size and value is not None})
+    name = args.size if size == SIZES[args.size] else "custom-{genes}x{isolates}x{databases}".format(**size)
+
+    data = args.data or tempfile.mkdtemp(prefix="tuatara-bench-")
+    config = path.join(data, "config.yaml")
+    try:
+        if not path.isfile(config):
+            make_dataset(data, **size)
+        print(f"Dataset {name}: {size['genes']} genes x {size['isolates']} isolates x {size['databases']} databases")
+
+        cwd = os.getcwd()
+        os.chdir(path.join(data, "work"))                                                           # model files are read from the working directory
+        try:
+            results = run(config, args.repeat, args.workers, args.hatch_eggs)
+        finally:
+            os.chdir(cwd)
+    finally:
+        if not args.data:
+            shutil.rmtree(data, ignore_errors=True)
+
+    baselines = {}
+    if path.isfile(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baselines = json.load(f)
+
+    regressions = []
+    if args.no_compare or name not in baselines:
+        for measurement, seconds in results.items():
+            print(f"{measurement:<36}{seconds:>14.4f}")
+    else:
+        regressions = compare(results, baselines[name]["timings"], args.tolerance, args.min_seconds)
+
+    if args.save:
+        baselines[name] = {
+            "size" : size,
+            "workers" : args.workers,
+            "machine" : f"{platform.machine()}, {os.cpu_count()} CPUs, Python {platform.python_version()}",
+            "timings" : results
+            }
+        with open(args.baseline, 'w') as f:
+            json.dump(baselines, f, indent=4)
+        print(f"Baseline for {name} saved to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} measurement(s) slower than baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
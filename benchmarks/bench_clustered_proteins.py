@@ -0,0 +1,131 @@
+"""
+Benchmark for reading a Roary clustered proteins file.
+
+Compares tuatara.core.readers.read_clustered_proteins against the readlines and
+regex loop previously used by BuildNest._build_reference_table. Both build the
+gene by database table of locus IDs from a synthetic file.
+
+Usage:
+
+    python benchmarks/bench_clustered_proteins.py --size-mb 200 --databases 5
+
+"""
+
+import argparse
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from tuatara.core.readers import read_clustered_proteins
+from tuatara.tools.utils import remove_suffix
+
+
+def loop_parse(fp, dbtags, genes):
+    """Reference implementation: the original readlines loop."""
+    order = {tag : index for index, tag in enumerate(dbtags.keys())}
+    gene_regex = r"^\w+[^_\-\d:]"
+    tag_regex = "|".join([item + r"_\d+" for item in dbtags.keys()])
+
+    tidy_locusid = {}
+    for line in open(fp).readlines():
+        gene = re.match(gene_regex, line)
+        values = re.findall(tag_regex , line)
+        gene = gene.group(0)
+
+        if gene != "group" and gene in genes:
+            row = [''] * len(dbtags) if gene not in tidy_locusid.keys() else tidy_locusid[gene]
+            for locus in values:
+                idtag = remove_suffix(locus)
+                index = order[idtag]
+                if row[index]:
+                    row[index] += ", " + locus
+                else:
+                    row[index] = locus
+            tidy_locusid.update({gene : row})
+    return tidy_locusid
+
+
+def stream_parse(fp, dbtags, genes):
+    order = {tag : index for index, tag in enumerate(dbtags.keys())}
+    tidy_locusid = {}
+    for gene, loci in read_clustered_proteins(fp, order, genes=set(genes)):
+        row = tidy_locusid.setdefault(gene, [''] * len(dbtags))
+        for idtag, locus in loci:
+            index = order[idtag]
+            if row[index]:
+                row[index] += ", " + locus
+            else:
+                row[index] = locus
+    return tidy_locusid
+
+
+def synthetic_clustered_proteins(fp, size_mb, databases, isolates=200, seed=0):
+    """
+    Writes a clustered proteins file of roughly size_mb megabytes.
+    Every tenth cluster is an unnamed group and every seventh gene carries a Roary suffix.
+    Returns the database tags and the gene names to keep, half of those in the file.
+    """
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    dbtags = {"".join(rng.choice(letters, 8)) : f"DB{i}" for i in range(databases)}
+    isolate_tags = ["".join(rng.choice(letters, 8)) for _ in range(isolates)]
+    loci = np.array([f"{tag}_{number:05d}" for tag in list(dbtags) + isolate_tags for number in range(1, 501)], dtype=object)
+
+    genes = []
+    written = 0
+    target = size_mb * 1_000_000
+    with open(fp, 'w') as f:
+        while written < target:
+            sizes = rng.integers(2, 60, size=10000)
+            members = np.split(loci[rng.integers(0, len(loci), size=sizes.sum())], np.cumsum(sizes)[:-1])
+            lines = []
+            for line_loci in members:
+                n = len(genes)
+                genes.append(f"gen{n}x")
+                if n % 10 == 0:
+                    name = f"group_{n}"
+                elif n % 7 == 0:
+                    name = genes[-1] + "_2"
+                else:
+                    name = genes[-1]
+                lines.append(name + ": " + "\t".join(line_loci) + "\n")
+            block = "".join(lines)
+            f.write(block)
+            written += len(block)
+    return dbtags, genes[::2]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=200)
+    parser.add_argument("--databases", type=int, default=5)
+    parser.add_argument("--skip-loop", action="store_true", help="only time the streaming parser")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp = os.path.join(tmp, "clustered_proteins")
+        dbtags, genes = synthetic_clustered_proteins(fp, args.size_mb, args.databases)
+        print(f"clustered_proteins: {os.path.getsize(fp) / 1e6:.0f} MB, {len(dbtags)} databases, {len(genes)} genes kept")
+
+        stream_time, result = timed(stream_parse, fp, dbtags, genes)
+        if not args.skip_loop:
+            loop_time, expected = timed(loop_parse, fp, dbtags, pd.Index(genes))
+            assert result == expected
+            print(f"readlines + regex loop:  {loop_time:.2f} s")
+            print(f"streaming parser:        {stream_time:.2f} s  ({loop_time / stream_time:.1f}x)")
+        else:
+            print(f"streaming parser:        {stream_time:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
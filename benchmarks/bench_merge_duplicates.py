@@ -0,0 +1,82 @@
+"""
+Benchmark for merging duplicated genes in a Roary gene presence/absence file.
+
+Compares tuatara.core.matrix.merge_duplicate_genes against the row-by-row loop
+previously used by BuildNest._merge_duplicate_genes.
+
+Usage:
+
+    python benchmarks/bench_merge_duplicates.py --rows 100000 --isolates 50
+
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from tuatara.core.matrix import merge_duplicate_genes
+from tuatara.tools.utils import remove_suffix
+
+
+def loop_merge(gpa):
+    """Reference implementation: the original itertuples loop."""
+    gpa_filtered = {}
+    for row in gpa.itertuples():
+        gene = remove_suffix(row[0])
+        if gene in gpa_filtered.keys():
+            gpa_filtered[gene] = np.maximum(gpa_filtered[gene], row[1:])
+        else:
+            gpa_filtered[gene] = row[1:]
+    return pd.DataFrame.from_dict(gpa_filtered, orient='index', columns=gpa.columns)
+
+
+def synthetic_rtab(rows, isolates, duplicated=0.15, seed=0):
+    """Builds an Rtab-like DataFrame where a fraction of genes carry Roary suffixes (gene_2, gene_3)."""
+    rng = np.random.default_rng(seed)
+    letters = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+    genes = []
+    while len(genes) < rows:
+        name = "".join(rng.choice(letters, 3)) + rng.choice(letters).upper() + str(len(genes)) + "x"
+        genes.append(name)
+        for suffix in range(2, 2 + rng.binomial(2, duplicated)):
+            genes.append(f"{name}_{suffix}")
+    genes = genes[:rows]
+    rng.shuffle(genes)
+    values = rng.integers(0, 2, size=(rows, isolates), dtype=np.uint8)
+    columns = [f"isolate_{i}" for i in range(isolates)]
+    return pd.DataFrame(values, index=pd.Index(genes, name="Gene"), columns=columns)
+
+
+def best_of(func, gpa, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(gpa)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--isolates", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    gpa = synthetic_rtab(args.rows, args.isolates)
+
+    loop_time, expected = best_of(loop_merge, gpa, args.repeat)
+    vector_time, result = best_of(merge_duplicate_genes, gpa, args.repeat)
+
+    assert list(result.index) == list(expected.index)
+    assert (result.to_numpy() == expected.to_numpy()).all()
+
+    print(f"Rtab: {args.rows} rows x {args.isolates} isolates -> {len(result)} genes")
+    print(f"itertuples loop:   {loop_time:.3f} s")
+    print(f"vectorised merge:  {vector_time:.3f} s  ({loop_time / vector_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Synthetic inputs for benchmarking BuildNest and hatch.
+
+Writes everything a build reads, at a chosen number of genes, isolates and databases:
+
+    gpa.Rtab                    Roary gene presence/absence (with Roary suffixes and unnamed groups)
+    clustered_proteins          Roary clustered proteins, with database and isolate locus tags
+    annots/<database>.tabular   Prokka annotations of each database organism
+    biocyc/<database>/21.0/     stand-in BioCyc database directory (a genes.dat placeholder)
+    cache/                      reaction cache seeded with each database's reaction map
+    work/model.spy              model file holding a third of the database reactions
+    config.yaml                 inputs for read_yaml
+
+The reaction maps stand in for PyoCyc: they are stored in a ReactionCache for the placeholder
+database directories, so a build given cache_dir=<out>/cache never parses a database. Builds
+look for model files in the current working directory, so run them from <out>/work.
+
+Usage:
+
+    python benchmarks/synthetic.py /tmp/nest --genes 10000 --isolates 200 --databases 5
+
+"""
+
+import argparse
+import os
+import string
+from os import path
+
+import numpy as np
+
+from tuatara.core.cache import ReactionCache
+from tuatara.core.InputHandler import read_yaml
+
+
+LETTERS = np.array(list(string.ascii_lowercase))
+
+
+def gene_name(number):
+    "Roary style gene name (e.g. aaaB), unique for each number and without digits."
+    name = ""
+    number += 26 ** 3
+    while number:
+        number, remainder = divmod(number, 26)
+        name = string.ascii_lowercase[remainder] + name
+    return name[:-1] + name[-1].upper()
+
+
+def scrumpy_reaction(uid, rng, metabolites):
+    "A reaction as PyoCyc's AsScrumPy writes it."
+    substrates = rng.choice(metabolites, rng.integers(1, 4), replace=False)
+    products = rng.choice(metabolites, rng.integers(1, 4), replace=False)
+    sides = []
+    for side in (substrates, products):
+        sides.append(" + ".join((f"{rng.integers(2, 4)} " if rng.random() < 0.2 else "") + f'"{metabolite}"' for metabolite in side))
+    direction = rng.choice(["->", "<>", "<-"])
+    return f'"{uid}":\n    {sides[0]} {direction} {sides[1]}\n    ~'
+
+
+def make_dataset(out, genes=2000, isolates=50, databases=3, reactions_per_gene=1.5, seed=0):
+    """
+    Writes a synthetic dataset to out.
+
+        Parameters:
+            out (str) : output directory
+            genes (int) : number of genes (Rtab rows before duplicates and groups)
+            isolates (int) : number of isolates, excluding the model and databases
+            databases (int) : number of database organisms
+            reactions_per_gene (float) : mean number of reactions of a database gene
+            seed (int) : random seed
+
+        Returns:
+            config (str) : path of config.yaml
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(path.join(out, "annots"), exist_ok=True)
+    os.makedirs(path.join(out, "work"), exist_ok=True)
+
+    names = [gene_name(number) for number in range(genes)]
+    dbs = [f"DB{index}" for index in range(databases)]
+    columns = ["MODEL"] + dbs + [f"iso{index}" for index in range(isolates)]
+    tags = {db : "".join(rng.choice(LETTERS, 8)).upper() for db in dbs}
+
+    # Roary splits some genes (gene_2) and leaves some clusters unnamed (group_n)
+    rows = list(names)
+    rows += [names[index] + "_2" for index in rng.choice(genes, genes // 10, replace=False)]
+    rows += [f"group_{index}" for index in range(genes // 20)]
+    rows = [rows[index] for index in rng.permutation(len(rows))]
+
+    # about a third of genes are core, the rest are present at a rate drawn per gene
+    rates = np.where(rng.random(len(rows)) < 0.3, 1.0, rng.uniform(0.1, 0.9, len(rows)))
+    presence = (rng.random((len(rows), len(columns))) < rates[:, None]).astype(np.uint8)
+    with open(path.join(out, "gpa.Rtab"), 'w') as f:
+        f.write("Gene\t" + "\t".join(columns) + "\n")
+        for row, bits in zip(rows, presence.astype(str)):
+            f.write(row + "\t" + "\t".join(bits) + "\n")
+
+    # database loci are annotated with the cluster's gene name, another gene's name or none
+    counters = {db : 0 for db in dbs}
+    annotations = {db : [] for db in dbs}
+    isolate_tags = ["".join(rng.choice(LETTERS, 8)).upper() for _ in range(min(isolates, 50))]
+    with open(path.join(out, "clustered_proteins"), 'w') as f:
+        for row, bits in zip(rows, presence):
+            loci = []
+            for db, present in zip(dbs, bits[1:databases + 1]):
+                for _ in range(present * rng.choice([1, 1, 1, 2])):
+                    counters[db] += 1
+                    locus = f"{tags[db]}_{counters[db]:05d}"
+                    draw = rng.random()
+                    name = row.split("_")[0] if draw < 0.75 else names[rng.integers(genes)] if draw < 0.85 else ""
+                    annotations[db].append((locus, name))
+                    loci.append(locus)
+            loci += [f"{tag}_{rng.integers(1, 10 ** 5):05d}" for tag in rng.choice(isolate_tags, rng.integers(1, 6))]
+            f.write(f"{row}: " + "\t".join(loci) + "\n")
+
+    for db in dbs:
+        with open(path.join(out, "annots", f"{db}.tabular"), 'w') as f:
+            f.write("locus_tag\tftype\tlength_bp\tgene\tEC_number\tCOG\tproduct\n")
+            for locus, name in annotations[db]:
+                f.write(f"{locus}\tCDS\t900\t{name}\t\t\thypothetical protein\n")
+
+    # a gene has the same reactions in every database, a few of which are written differently (conflicts)
+    metabolites = [f"CPD-{index}" for index in range(max(50, genes // 4))]
+    uids = [f"RXN-{index}" for index in range(int(genes * reactions_per_gene))]
+    reactions = {uid : scrumpy_reaction(uid, rng, metabolites) for uid in uids}
+    gene_reactions = {name : [uids[index] for index in rng.choice(len(uids), rng.poisson(reactions_per_gene), replace=False)] for name in names}
+    reaction_maps = {}
+    for db in dbs:
+        reaction_map = {}
+        for name in sorted({name for _, name in annotations[db] if name}):
+            if gene_reactions.get(name):
+                reaction_map[name] = {
+                    uid : scrumpy_reaction(uid, rng, metabolites) if rng.random() < 0.05 else reactions[uid]
+                    for uid in gene_reactions[name]}
+        reaction_maps[db] = reaction_map
+
+        data = path.join(out, "biocyc", db, "21.0", "data")
+        os.makedirs(data, exist_ok=True)
+        with open(path.join(data, "genes.dat"), 'w') as f:
+            f.write(f"# stand-in for the BioCyc database of {db}\n")
+
+    with open(path.join(out, "work", "model.spy"), 'w') as f:
+        for uid in uids[::3]:
+            f.write(reactions[uid] + "\n\n")
+
+    config = path.join(out, "config.yaml")
+    with open(config, 'w') as f:
+        f.write(f"model : MODEL\nroary : {path.join(out, 'gpa.Rtab')}\ndatabases :\n")
+        f.writelines(f"    {db} : {db}\n" for db in dbs)
+        f.write(f"fp : {path.join(out, 'biocyc')}\n"
+                f"annots : {path.join(out, 'annots')}\n"
+                f"locustags : {path.join(out, 'clustered_proteins')}\n"
+                "rename : \ndrop_columns : \n")
+
+    inputs = read_yaml(config)
+    cache = ReactionCache(path.join(out, "cache"))
+    for db in dbs:
+        cache.store(inputs.db_fp[db], reaction_maps[db])
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("out", help="output directory")
+    parser.add_argument("--genes", type=int, default=2000)
+    parser.add_argument("--isolates", type=int, default=50)
+    parser.add_argument("--databases", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    config = make_dataset(args.out, args.genes, args.isolates, args.databases, seed=args.seed)
+    print(f"Inputs written to {config}; build from {path.join(args.out, 'work')} with cache_dir={path.join(args.out, 'cache')}")
+
+
+if __name__ == "__main__":
+    main()
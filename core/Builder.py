@@ -14,31 +14,111 @@ Classes
 # TODO: rename the sections for the output files
 
 
-import csv
+import hashlib
+import io
+import json
 import logging
-import mmap
+import os
 import re
+import shutil
+import tempfile
 # import sys
-from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from os import getcwd, listdir, path
 
 import numpy as np
 import pandas as pd
-from ScrumPy.Bioinf import PyoCyc
 
 from ..nest import DIR
-from ..tools.utils import (HidePrints, add_prefix, list_identical,
-                           remove_suffix, split_reaction, str_identical,
-                           str_len)
+from ..nest.hatcher import compile_egg
+from ..nest.keeper import Manifest, atomic_write, check_egg_exists, get_path, remove_stale, write_alias
+from .cache import ReactionCache
+from .checkpoint import Checkpoint, inputs_fingerprint
+from .matrix import GeneMatrix, merge_duplicate_genes, read_rtab
+from .profiler import Profiler
+from .reactions import ReactionTable
+from .readers import read_annotations, read_clustered_proteins
+from .shards import in_shard, parse_shard
+from ..tools.utils import (HidePrints, add_prefix, canonical_reaction,
+                           remove_suffix, str_len)
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
 
 
+# Bump when the layout of .spy files changes so incremental builds rewrite every egg.
+_MANIFEST_VERSION = 1
+
+# Stages of a build saved to a checkpoint, in the order they complete.
+_STAGES = ("gpa", "accessory", "hashtable", "reactions")
+
+# BuildNest instance shared with each worker process when writing eggs in parallel.
+_worker_nest = None
+
+
+def _init_worker(nest):
+    "Process pool initialiser; keeps a reference to the (read-only) BuildNest in the worker."
+    global _worker_nest
+    _worker_nest = nest
+    _worker_nest.profile = Profiler(memory=nest.profile.memory)                                    # egg records are sent back to the parent
+
+
+def _write_egg_worker(egg):
+    "Writes a single egg from inside a worker process and returns its statement and profile."
+    profile = _worker_nest.profile
+    with profile.egg(egg):
+        statement = _worker_nest._write_egg(egg)
+    return egg, statement, profile.eggs.pop(egg)
+
+
+def _parse_database(fp):
+    """
+    Parses a BioCyc database with PyoCyc and maps each gene to its reactions.
+
+        Parameters:
+            fp (str) : database file path
+
+        Returns:
+            reaction_map (dict) : 
+                keys (str) : common gene name
+                values (dict) : 
+                    keys (str) : reaction unique ID
+                    values (str) : reaction as ScrumPy
+    """
+    # imported here so builds served from the reaction cache never load PyoCyc
+    from ScrumPy.Bioinf import PyoCyc
+
+    reaction_map = {}
+    with HidePrints():
+        db = PyoCyc.Organism(data="data", Path=fp)
+ 
+    UIDs = [gene['UNIQUE-ID'][0] for gene in db.dbs['GENE'].values()]
+    for UID in UIDs:
+        try:
+            gene = db.dbs['GENE'][UID]['COMMON-NAME'][0]
+        except KeyError:
+            gene = False
+        
+        if gene:
+            # try:
+            reactions = db.dbs['GENE'][UID].GetReactions()
+            # except:
+            #     reactions = False
+            
+            if reactions:
+                r = {reac.UID : reac.AsScrumPy() for reac in reactions if "!" not in reac.AsScrumPy()}
+                if r:
+                    reaction_map[gene] = r
+    
+    return reaction_map
+
+
 class _ToNest:
     """
     A context manager class for building .spy files for an egg.
-    All material passed to _Writer is written to file upon exiting context manager.
+    Each section is streamed into its own spooled buffer (kept in memory until it grows large,
+    then moved to a temporary file) and the sections are assembled into the .spy file upon exiting 
+    the context manager.
 
     Use:
     -----------
@@ -46,6 +126,15 @@ class _ToNest:
     with _ToNest(egg) as tnt:
         ***code block***
     
+    with _ToNest(egg, compress=True) as tnt:    # writes egg.spy.gz
+        ***code block***
+
+    with _ToNest(egg, directory=egg_dir) as tnt:    # writes egg_dir/egg.spy
+        ***code block***
+
+    with _ToNest(egg, compile=True) as tnt:     # also writes the compiled egg, egg.spyc
+        ***code block***
+
 
     Methods
     -------
@@ -53,70 +142,182 @@ class _ToNest:
     zero_flux_unidentified(reactions)
     add_reactions(reactions)
     add_conflicts(self, conflicts)
+    add_uncovered_genes(genes)
 
     """
 
-    def __init__(self, egg):
+    # size a section can reach before it is spooled to a temporary file
+    _buffer_size = 1 << 20
+
+    def __init__(self, egg, compress=False, directory=DIR, compile=False):
 
         self._name          = egg
+        self._compress      = compress
+        self._compile       = compile
+        self._directory     = directory
         self._file          = None
         self._entry         =   (   "# This file was made with the tuatara package.\n"
                                     "# Use tuatara.hatch() to swap reactions \n\n\n")
-        self._zero_flux     = "############################# REACTIONS TO REMOVE ##############################\n"
-        self._unidentified  = "###################### REACTIONS NOT FOUND IN MODEL FILES ######################\n"
-        self._reactions     = "############################### REACTIONS TO ADD ###############################\n"
-        self._conflicts     = "########################### REACTIONS WITH CONFLICTS ###########################\n"
-        self._uncovered     = "############################## GENES NOT COVERED ###############################\n"
+        self._zero_flux     = self._section("############################# REACTIONS TO REMOVE ##############################\n")
+        self._unidentified  = self._section("###################### REACTIONS NOT FOUND IN MODEL FILES ######################\n")
+        self._reactions     = self._section("############################### REACTIONS TO ADD ###############################\n")
+        self._conflicts     = self._section("########################### REACTIONS WITH CONFLICTS ###########################\n")
+        self._uncovered     = self._section("############################## GENES NOT COVERED ###############################\n")
         # statements are flanked with a single space, uppercase and centered using .center(80, "#")
 
 
-    def __enter__(self):
-        self._file = open(f"{DIR}/{self._name}.spy", "w+")
+    def _section(self, heading):
+        section = tempfile.SpooledTemporaryFile(max_size=self._buffer_size, mode="w+")
+        section.write(heading)
+        return section
+
 
-        self._file.write(self._entry)
-        self._file.write(f"# Egg ID: {self._name}\n\n")
+    def __enter__(self):
         return self
 
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        "Writes to .spy file for egg upon exiting context manager"
-        self._file.write("\n\n\n".join([
-                                    self._conflicts,
-                                    self._unidentified,
-                                    self._zero_flux,
-                                    self._reactions,
-                                    self._uncovered
-                                    ]))
-        self._file.close()
+        """
+        Writes to .spy file for egg upon exiting context manager.
+        The file is written to a temporary file and renamed into place, so readers never see a
+        partly written egg, and nothing is written if the block raised.
+        """
+        sections = [
+                    self._conflicts,
+                    self._unidentified,
+                    self._zero_flux,
+                    self._reactions,
+                    self._uncovered
+                    ]
+        try:
+            if exc_type is not None:
+                return
+
+            egg_path = get_path(self._name + (".spy.gz" if self._compress else ".spy"), directory=self._directory)
+            with atomic_write(egg_path, compress=self._compress) as self._file:
+                text = io.StringIO() if self._compile else self._file                               # kept in memory to be compiled
+                text.write(self._entry)
+                text.write(f"# Egg ID: {self._name}\n\n")
+                for index, section in enumerate(sections):
+                    if index:
+                        text.write("\n\n\n")
+                    section.seek(0)
+                    shutil.copyfileobj(section, text)
+                if self._compile:
+                    self._file.write(text.getvalue())
+
+            if self._compile:
+                text.seek(0)
+                compile_egg(egg_path, lines=text)
+
+            # an egg is kept either compressed or uncompressed, never both
+            remove_stale(self._name, self._compress, directory=self._directory)
+        finally:
+            for section in sections:
+                section.close()
+
+
+    @staticmethod
+    def _join(section, items, separator="\n\n"):
+        for index, item in enumerate(items):
+            if index:
+                section.write(separator)
+            section.write(item)
 
 
     def zero_flux(self, reactions: list):
         """Add reactions to be zero flux"""
-        self._zero_flux += "\n\n".join(reactions)
+        self._join(self._zero_flux, reactions)
 
 
     def zero_flux_unidentified(self, reactions: list):
         """Same as zero_flux but for reactions not found in model"""
-        self._unidentified += "\n\n".join(reactions)
+        self._join(self._unidentified, reactions)
 
 
     def add_reactions(self, reactions: list):
         """Add reactions to .spy file"""
-        self._reactions += "\n\n".join(reactions)
+        self._join(self._reactions, reactions)
 
 
     def add_conflicts(self, conflicts: list):
         """Add a reaction but flag as having confliction between databases"""
         for conflict in conflicts:
             for rUID, reactions in conflict.items():
-                self._conflicts += f"\n# Conflict found for reaction: {rUID}\n"
+                self._conflicts.write(f"\n# Conflict found for reaction: {rUID}\n")
                 for order, reaction in enumerate(reactions, start=1):
-                    self._conflicts += f"# Conflict {order}\n {reaction}\n"
+                    self._conflicts.write(f"# Conflict {order}\n {reaction}\n")
 
     
     def add_uncovered_genes(self, genes: list):
         for gene in genes:
-            self._uncovered += f'#{gene}\n'
+            self._uncovered.write(f'#{gene}\n')
+
+
+class _ModelIndex:
+
+    """
+    An index of which reaction UIDs appear in the model (.spy) files of a directory.
+
+    Each model file is read once and a UID is found when it occurs anywhere in the file,
+    the same as a substring search. A UID without delimiter characters can only occur inside
+    a single token, so it is looked up in the file's set of unique tokens instead of the whole file.
+
+    ...
+    Parameters:
+        directory (str) : directory containing the model files
+        uids (iterable) : reaction unique IDs to look for
+    
+    Attributes
+    ----------
+    files : list
+        Model files in the directory
+
+    fingerprint : str
+        Digest of the model files' names, sizes and modification times
+    
+    Methods
+    -------
+        position(uid)
+
+    """
+
+    _delimiters = re.compile(rb"[\s\"':;,()]+")
+
+    def __init__(self, directory, uids):
+        self.files = [spy_file for spy_file in listdir(directory) if spy_file.endswith(".spy")]
+        self._found = {}
+
+        digest = hashlib.sha1()
+        for spy_file in self.files:
+            stat = os.stat(path.join(directory, spy_file))
+            digest.update(f"{spy_file}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        self.fingerprint = digest.hexdigest()
+
+        keys = {uid : uid.encode('utf8') for uid in uids}
+        plain = {uid for uid, key in keys.items() if not self._delimiters.search(key)}
+
+        for position, spy_file in enumerate(self.files):
+            with open(path.join(directory, spy_file), 'rb') as f:
+                content = f.read()
+            tokens = set(self._delimiters.split(content))
+            unique_tokens = b"\n".join(tokens)
+
+            for uid, key in keys.items():
+                if uid in self._found:
+                    continue
+                haystack = unique_tokens if uid in plain else content
+                if key in tokens or haystack.find(key) != -1:
+                    self._found[uid] = position
+
+
+    def __contains__(self, uid):
+        return uid in self._found
+
+
+    def position(self, uid):
+        """Index of the first model file containing uid, or None if no model file does."""
+        return self._found.get(uid)
 
 
 class BuildNest:
@@ -128,6 +329,23 @@ class BuildNest:
     Parameters:
         inputs (obj) : A class object containing all necessary inputs.
         debug (bool) : run BuildNest without writing to spy files.
+        workers (int) : number of processes used to parse databases and write eggs (default: 1, serial).
+        incremental (bool) : skip eggs whose inputs are unchanged since they were last written.
+        dedupe (bool) : write eggs with identical gene profiles once and store the others as aliases.
+        compress (bool) : write eggs as gzip-compressed .spy.gz files.
+        compile (bool) : also write each egg as a compiled egg (.spyc), which hatch loads with a single read.
+        egg_dir (str) : directory to write eggs to (default: tuatara/nest/eggs).
+        cache_dir (str|bool) : directory for caching database reaction maps (default: tuatara/core/cache).
+            Set to False to always parse databases with PyoCyc.
+        checkpoint_dir (str|bool) : directory for saving the intermediate results of each stage and the
+            eggs written so far. Checkpoints are only saved when a directory is given, or when resuming or
+            building a shard (default: tuatara/core/checkpoints, also used for True). Set to False to disable.
+        resume (bool) : continue from the last completed stage and egg of a checkpoint with the same inputs.
+            A build run with resume=True saves a checkpoint to resume from if it is interrupted.
+        shard (str|tuple) : only write the eggs of shard "i/N" (i from 0 to N - 1), for building a nest across
+            several machines. Completed stages are loaded from the checkpoint shared by the shards (see shards.py).
+        profile_memory (bool) : also record peak memory of each stage and egg with tracemalloc (slow).
+        on_profile (callable) : called as on_profile(kind, name, record) as each stage and egg is profiled.
 
     
     Attributes
@@ -148,13 +366,27 @@ class BuildNest:
     names : list
         List of all eggs found in roary gene presence/absence file
 
+    skipped : list
+        Eggs left as they were by an incremental build
+
+    aliases : dict
+        Eggs stored as an alias of an egg with the same gene profile (key : alias, value : egg)
+
+    egg_dir : str
+        Directory the eggs are written to
+
+    profile : Profiler
+        Wall time, CPU time and peak memory of each build stage and egg (see Profiler.report and Profiler.to_json)
+
     Methods
     -------
         database_coverage
+        export(fp=None)
 
     """
 
-    def __init__(self, inputs, debug=False):
+    def __init__(self, inputs, debug=False, workers=1, cache_dir=None, incremental=False, dedupe=False, compress=False,
+                 compile=False, egg_dir=None, checkpoint_dir=None, resume=False, shard=None, profile_memory=False, on_profile=None):
 
         # private imported attributes from inputs
         self._db =          inputs._db_fp
@@ -165,15 +397,34 @@ class BuildNest:
         self._gpa_fp =      inputs.gpafile
         self._locustags =   inputs.locustags
         self._annots =      inputs.annotations
+        self._workers =     workers
+        self._incremental = incremental
+        self._dedupe =      dedupe
+        self._compress =    compress
+        self._compile =     compile
+        self._resume =      resume
+        self._shard =       parse_shard(shard) if shard is not None else None
         
         # private class attributes
         self._hashtable =        None
         self._reaction_master =  {}
         self._conflicts =        {}
         self._accessory =        None
+        self._cache =            ReactionCache(cache_dir) if cache_dir is not False else None
+        self._model_index =      None
+        self._gene_sets =        None
+        self._model_positions =  None
+        self._checkpoint =       None
+        if checkpoint_dir or (checkpoint_dir is None and (resume or shard)):                         # checkpoints are opt-in, they hold every stage's results
+            self._checkpoint =   Checkpoint(checkpoint_dir if isinstance(checkpoint_dir, str) else None, inputs_fingerprint(inputs))
+        self._resumed =          0
 
         # public class attributes
+        self.egg_dir = egg_dir or DIR
         self.eggs = {}
+        self.skipped = []
+        self.aliases = {}
+        self.profile = Profiler(memory=profile_memory, callback=on_profile)
 
         # method calls
         self._log_inputs()
@@ -188,65 +439,302 @@ class BuildNest:
 
         log.info("Building nest...")
 
-        gpa = pd.read_table(self._gpa_fp, index_col=0)                                               # read gene presence/absence file
-        if self._rename:
-            gpa = gpa.rename(columns=self._rename)
-        if self._col_drop:
-            gpa = gpa.drop(self._col_drop, axis=1)
+        self._resumed = self._resume_point()
+        if self._resumed:
+            with self.profile.stage("restore_checkpoint"):
+                gpa = self._restore()
+
+        if self._pending("gpa"):
+            with self.profile.stage("read_rtab"):
+                gpa = read_rtab(self._gpa_fp)                                                       # read gene presence/absence file
+                if self._rename:
+                    gpa = gpa.rename(columns=self._rename)
+                if self._col_drop:
+                    gpa = gpa.drop(self._col_drop, axis=1)
+
+            log.info("Number of genes present in roary file: " + str_len(gpa))
+            with self.profile.stage("merge_duplicate_genes"):
+                gpa = self._merge_duplicate_genes(gpa)                                               # Merge duplicated genes
+            log.info("Number of genes after flattening: " + str_len(gpa))
+            self._save_checkpoint("gpa", gpa)
+
+        if self._pending("accessory"):
+            with self.profile.stage("accessory"):
+                gpa = GeneMatrix.from_frame(gpa)                                                    # Pack into one bit per gene per isolate
+                self._accessory = gpa.select(~gpa.all())                                            # Remove core genes nothing needs to be done.
+
+                log.info("Size of accessory genome (databases included): " + str_len(self._accessory))
+                self.database_coverage()
+
+                self._accessory = self._accessory.select(self._accessory.any(self._dbs))             # Get only genes present in a database
+            self._save_checkpoint("accessory", self._accessory)
+        del gpa
+
+        if self._pending("hashtable"):
+            with self.profile.stage("build_reference_table"):
+                self._hashtable = self._build_reference_table()
+            self._save_checkpoint("hashtable", self._hashtable)
+
+        if self._pending("reactions"):
+            self._reaction_master = {gene : {} for gene in self._accessory.index}
+            log.info("Loading databases... this may take a moment.")
+            with self.profile.stage("load_databases"):
+                reaction_maps = self._load_databases()
+            with self.profile.stage("merge_reactions"):
+                for dname, reaction_map in zip(self._dbs, reaction_maps):                          # merged in database order so conflicts are reproducible
+                    self._buildMasterReaction(dname, reaction_map)
+                canonical_reaction.cache_clear()
+                self._reaction_master = ReactionTable.from_dict(self._reaction_master)             # compact once every database is merged
+            del reaction_maps
+            self._save_checkpoint("reactions", (self._reaction_master, self._conflicts))
+        self._log_reactions()
 
-        log.info("Number of genes present in roary file: " + str_len(gpa))
-        gpa = self._merge_duplicate_genes(gpa)                                                       # Merge duplicated genes
-        log.info("Number of genes after flattening: " + str_len(gpa))
+        if debug:
+            return self
 
-        gpa = gpa.replace(0, np.NaN)                                                                # Replace 0 with NaN so they're not seen as values
-        self._accessory = gpa[~gpa.notna().all(axis=1)]                                              # Remove core genes nothing needs to be done.
+        with self.profile.stage("index_model_files"):
+            self._index_model_files()
+        eggs = list(self._accessory.columns.difference(self._dbs))
+        with self.profile.stage("write_eggs"):
+            self._write_eggs(eggs)
 
-        log.info("Size of accessory genome (databases included): " + str_len(self._accessory))
-        self.database_coverage()
+        log.info("Build complete. See 'BuildNest.eggs' for information relating to each egg.")
 
-        self._accessory = self._accessory[~self._accessory[self._dbs].isna().all(axis="columns")]      # Get only genes present in a database
-        self._hashtable = self._build_reference_table()
 
-        self._reaction_master = {gene : {} for gene in self._accessory.index}
-        log.info("Loading databases... this may take a moment.")
-        for dname in self._dbs:
-            self._buildMasterReaction(dname)
-        self._log_reactions()
+    def _write_eggs(self, eggs):
+        """
+        Writes the .spy file of each egg and records it in the nest manifest.
+        When building incrementally, eggs whose inputs match the manifest are skipped.
+        When resuming, eggs already written from the same inputs since the checkpoint are skipped.
+        """
+        os.makedirs(self.egg_dir, exist_ok=True)
+        manifest = Manifest(self.egg_dir)
+        if self._dedupe:
+            self.aliases = self._find_aliases(eggs, {egg : self._egg_genes(egg) for egg in eggs})
+        if self._shard is not None:
+            eggs = self._shard_eggs(eggs)
+
+        genes = {egg : self._egg_genes(egg) for egg in eggs}
+        digests = {egg : self._egg_digest(egg, genes[egg]) for egg in eggs}
+        statements = {}
+
+        if self._dedupe:
+            for alias, payload in self.aliases.items():                                             # an alias is stale once its payload changes
+                digests[alias] = hashlib.sha1(f"{digests[alias]}:{payload}:{digests[payload]}".encode()).hexdigest()
+
+        if self._incremental:
+            self.skipped = [egg for egg in eggs if manifest.unchanged(egg, digests[egg])]
+            statements.update({egg : manifest.statement(egg) for egg in self.skipped})
+            log.info(f"Eggs unchanged since last build: {len(self.skipped)} of {len(eggs)} skipped.")
+
+        to_record = [egg for egg in eggs if egg not in statements]
+        if self._resume and self._checkpoint is not None:
+            completed = self._checkpoint.completed_eggs()
+            resumed = [egg for egg in to_record if completed.get(egg, (None,))[0] == digests[egg] and check_egg_exists(egg, directory=self.egg_dir)]
+            statements.update({egg : completed[egg][1] for egg in resumed})
+            log.info(f"Eggs written before the build was interrupted: {len(resumed)} of {len(eggs)} resumed.")
+
+        to_write = [egg for egg in eggs if egg not in statements]
+        payloads = [egg for egg in to_write if egg not in self.aliases]
+        if self._workers > 1 and len(payloads) > 1:
+            written = self._write_eggs_parallel(payloads)
+        else:
+            written = self._write_eggs_serial(payloads)
+        for egg, statement in written:
+            statements[egg] = statement
+            self._checkpoint_egg(egg, digests[egg], statement)
 
-        if debug:
-            return self
+        for egg in to_write:
+            if egg in self.aliases:
+                statements[egg] = self._write_alias(egg, self.aliases[egg], statements[self.aliases[egg]])
+                self._checkpoint_egg(egg, digests[egg], statements[egg])
+        if self.aliases:
+            log.info(f"Eggs stored as aliases of an identical egg: {len(self.aliases)}")
 
-        for egg in self._accessory[self._accessory.columns.difference(self._dbs)].columns:
-            with _ToNest(egg) as tnt:
-                egg_df = self._accessory[[self._model, egg]]
-
-                inmodel, notinmodel = self._verify_in_model(
-                    egg_df[egg][egg_df[self._model].notna() & egg_df[egg].isna()].index
-                    )
-                tnt.zero_flux(inmodel)
-                tnt.zero_flux_unidentified(notinmodel)
-
-                reacs_to_add, reacs_with_conflicts = self._reactions_to_add(
-                    egg_df[egg][egg_df[self._model].isna() & egg_df[egg].notna()].index
-                )
-                tnt.add_reactions(reacs_to_add)
-                tnt.add_conflicts(reacs_with_conflicts)
-
-                genes_not_covered = self._accessory[(self._accessory[self._dbs].isna().all(axis="columns")) & self._accessory[egg].notna()].index
-                tnt.add_uncovered_genes(genes_not_covered)
-
-                statement = "\n".join([
-                                    "Egg ID: "                                                              + egg,
-                                    "Reactions with conflicts: "                                            + str_len(reacs_with_conflicts),
-                                    "Number of reactions absent in egg but were not found in model files: " + str_len(notinmodel),
-                                    "Number of reactions absent in egg: "                                   + str_len(inmodel),
-                                    "Number of reactions added: "                                           + str_len(reacs_to_add),
-                                    "Number of genes not covered by databases: "                            + str_len(genes_not_covered)
-                                    ])
-
-                self.eggs[egg] = statement
-                                            
-        log.info("Build complete. See 'BuildNest.eggs' for information relating to each egg.")
+        for egg in to_record:
+            manifest.record(egg, digests[egg], statements[egg])
+        manifest.save()
+
+        self.eggs.update({egg : statements[egg] for egg in eggs})
+
+
+    def _shard_eggs(self, eggs):
+        """
+        Returns the eggs of this build's shard. An alias is kept in the shard of the egg it
+        points to, so the shard writing an egg also writes its aliases.
+        """
+        shard_eggs = [egg for egg in eggs if in_shard(self.aliases.get(egg, egg), self._shard)]
+        self.aliases = {alias : payload for alias, payload in self.aliases.items() if in_shard(payload, self._shard)}
+        log.info(f"Shard {self._shard[0]}/{self._shard[1]}: writing {len(shard_eggs)} of {len(eggs)} eggs.")
+        return shard_eggs
+
+
+    def _nest_genes(self):
+        """
+        Finds the genes of every egg relative to the model at once, see _egg_genes.
+        Returns a GeneSets for each of absent, added and not covered genes.
+        """
+        eggs = list(self._accessory.columns.difference(self._dbs))
+        model_bits = self._accessory[self._model]
+        covered = self._accessory.any(self._dbs)
+
+        absent = self._accessory.gene_sets(eggs, lambda bits: model_bits & ~bits)
+        added = self._accessory.gene_sets(eggs, lambda bits: ~model_bits & bits)
+        not_covered = self._accessory.gene_sets(eggs, lambda bits: ~covered & bits)
+        return absent, added, not_covered
+
+
+    def _egg_genes(self, egg):
+        """
+        Returns the genes of an egg relative to the model:
+        (genes absent in egg, genes added in egg, genes not covered by databases)
+        """
+        if self._gene_sets is None:
+            self._gene_sets = self._nest_genes()
+        return tuple(gene_set[egg] for gene_set in self._gene_sets)
+
+
+    def _find_aliases(self, eggs, genes):
+        """
+        Groups eggs by their gene profile (the genes from _egg_genes).
+        The first egg of each group holds the contents, the rest become aliases of it.
+        Returns {alias : payload}.
+        """
+        payloads = {}
+        aliases = {}
+        for egg in eggs:
+            profile = hashlib.sha1(repr([list(gene_set) for gene_set in genes[egg]]).encode()).hexdigest()
+            if profile in payloads:
+                aliases[egg] = payloads[profile]
+            else:
+                payloads[profile] = egg
+        return aliases
+
+
+    def _write_alias(self, egg, payload, payload_statement):
+        "Writes an egg as an alias of payload and returns its statement."
+        write_alias(egg, payload, directory=self.egg_dir)
+        _, contents = payload_statement.split("\n", 1)
+        return "\n".join(["Egg ID: " + egg, contents, "Alias of: " + payload])
+
+
+    def _egg_digest(self, egg, genes):
+        "A digest of everything an egg's .spy file is built from; its genes, their reactions and the model files."
+        absent, added, not_covered = genes
+        if self._model_index is None:
+            self._index_model_files()
+
+        digest = hashlib.sha1(f"{_MANIFEST_VERSION}:{egg}:{self._compress}:{self._model_index.fingerprint}".encode())
+        if self._compile:                                                                           # so eggs built without it are compiled
+            digest.update(b"compiled")
+        for genes in (absent, added):
+            uid_ids, reaction_ids = self._reaction_master.gather(genes)
+            digest.update(repr([
+                list(zip(genes, self._reaction_master.counts(genes).tolist())),
+                self._reaction_master.uids[uid_ids].tolist(),
+                self._reaction_master.reactions[reaction_ids].tolist(),
+                [self._conflicts.get(gene) for gene in genes]
+                ]).encode())
+        digest.update(repr(list(not_covered)).encode())
+        return digest.hexdigest()
+
+
+    def _write_egg(self, egg):
+        """Writes the .spy file for an egg and returns a statement summarising its contents."""
+        absent, added, genes_not_covered = self._egg_genes(egg)
+
+        with _ToNest(egg, compress=self._compress, directory=self.egg_dir, compile=self._compile) as tnt:
+            inmodel, notinmodel = self._verify_in_model(absent)
+            tnt.zero_flux(inmodel)
+            tnt.zero_flux_unidentified(notinmodel)
+
+            reacs_to_add, reacs_with_conflicts = self._reactions_to_add(added)
+            tnt.add_reactions(reacs_to_add)
+            tnt.add_conflicts(reacs_with_conflicts)
+
+            tnt.add_uncovered_genes(genes_not_covered)
+
+        statement = "\n".join([
+                            "Egg ID: "                                                              + egg,
+                            "Reactions with conflicts: "                                            + str_len(reacs_with_conflicts),
+                            "Number of reactions absent in egg but were not found in model files: " + str_len(notinmodel),
+                            "Number of reactions absent in egg: "                                   + str_len(inmodel),
+                            "Number of reactions added: "                                           + str_len(reacs_to_add),
+                            "Number of genes not covered by databases: "                            + str_len(genes_not_covered)
+                            ])
+        return statement
+
+
+    def _write_eggs_serial(self, eggs):
+        "Writes eggs one at a time, yielding each egg and its statement once written."
+        for egg in eggs:
+            with self.profile.egg(egg):
+                statement = self._write_egg(egg)
+            yield egg, statement
+
+
+    def _write_eggs_parallel(self, eggs):
+        """
+        Writes eggs across a pool of worker processes, yielding each egg and its statement.
+        Statements are yielded in the same order as eggs so BuildNest.eggs matches a serial build.
+        Each worker profiles the eggs it writes and the records are added to BuildNest.profile.
+        """
+        log.info(f"Writing {len(eggs)} eggs using {self._workers} workers.")
+        chunksize = max(1, len(eggs) // (self._workers * 4))
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for egg, statement, record in pool.map(_write_egg_worker, eggs, chunksize=chunksize):
+                self.profile.eggs[egg] = record
+                if self.profile.callback is not None:
+                    self.profile.callback("egg", egg, record)
+                yield egg, statement
+
+
+    #---------------------------------------------
+    #checkpoints
+
+    def _resume_point(self) -> int:
+        "Number of stages which can be restored from the checkpoint (0 unless resuming or building a shard)."
+        if not (self._resume or self._shard) or self._checkpoint is None:
+            return 0
+        completed = 0
+        for stage in _STAGES:
+            if not self._checkpoint.has(stage):
+                break
+            completed += 1
+        return completed
+
+
+    def _pending(self, stage) -> bool:
+        "True if stage still has to be run."
+        return _STAGES.index(stage) >= self._resumed
+
+
+    def _restore(self):
+        """
+        Restores the results of the stages completed before the checkpoint.
+        Returns the flattened gpa if only that stage was completed.
+        """
+        last = _STAGES[self._resumed - 1]
+        log.info(f"Resuming build from {self._checkpoint} after stage: {last}")
+        if last == "gpa":
+            return self._checkpoint.load("gpa")
+        self._accessory = self._checkpoint.load("accessory")
+        if not self._pending("hashtable"):
+            self._hashtable = self._checkpoint.load("hashtable")
+        if not self._pending("reactions"):
+            self._reaction_master, self._conflicts = self._checkpoint.load("reactions")
+        return None
+
+
+    def _save_checkpoint(self, stage, obj):
+        if self._checkpoint is not None:
+            with self.profile.stage("checkpoint_" + stage):
+                self._checkpoint.save(stage, obj)
+
+
+    def _checkpoint_egg(self, egg, digest, statement):
+        if self._checkpoint is not None:
+            self._checkpoint.record_egg(egg, digest, statement)
 
 
     #---------------------------------------------
@@ -263,20 +751,43 @@ class BuildNest:
         log.debug("Drop columns: "              + ", ".join(self._col_drop))
 
 
+    def export(self, fp=None) -> dict:
+        """
+        Exports the statement of each egg, the skipped eggs, aliases and profile of this build,
+        to be combined with the other shards of a build by shards.merge_shards.
+
+            Parameters:
+                fp (str) : file path to write the report to as JSON (optional)
+
+            Returns:
+                report (dict)
+        """
+        report = {
+            "shard" : list(self._shard or (0, 1)),
+            "eggs" : self.eggs,
+            "skipped" : self.skipped,
+            "aliases" : self.aliases,
+            "profile" : self.profile.report()
+            }
+        if fp:
+            with open(fp, 'w') as f:
+                json.dump(report, f, indent=4)
+        return report
+
+
     def database_coverage(self):
         """Calculates database coverage of all genes present"""
-        notindb = self._accessory[self._accessory[self._dbs].isna().all(axis="columns")].index
-        indb = self._accessory[~self._accessory.index.isin(notindb)].index
+        indb = self._accessory.count(self._accessory.any(self._dbs))
 
-        missing = len(notindb)
-        per_coverage = 100 - (len(notindb)/len(indb))*100
+        missing = len(self._accessory) - indb
+        per_coverage = 100 - (missing/indb)*100
 
         log.info("Percent gene coverage from databases: {:.2f}%".format(per_coverage))
         log.info("Number of genes not covered: " + str(missing))
 
 
     def _log_reactions(self):
-        number_of_reactions = sum([len(reaction) for reaction in self._reaction_master.values()])
+        number_of_reactions = len(self._reaction_master)
         number_of_conflicts = len(self._conflicts)
         log.info("Total number of reactions collected from databases: " + str(number_of_reactions))
         log.info("                           of which have conflicts: " + str(number_of_conflicts))
@@ -286,18 +797,8 @@ class BuildNest:
     #core methods
 
     def _merge_duplicate_genes(self, gpa : pd.DataFrame) -> pd.DataFrame:
-        # While there is a way of doing this using pandas, it is considerably slower (~14 seconds)
         """Takes gpa DataFrame and merges rows with duplicated gene names. Returns DataFrame."""
-        gpa_filtered = {}
-        for row in gpa.itertuples():
-            gene = remove_suffix(row[0])
-            if gene in gpa_filtered.keys():
-                gpa_filtered[gene] = np.maximum(gpa_filtered[gene], row[1:])
-            else:
-                gpa_filtered[gene] = row[1:]
-
-        gpafil = pd.DataFrame.from_dict(gpa_filtered, orient='index', columns=gpa.columns)
-        return gpafil
+        return merge_duplicate_genes(gpa)
 
 
     def _map_tag_db(self):
@@ -309,8 +810,9 @@ class BuildNest:
         """
         dbtags = {}
         for db in self._dbs:
-            dbfile = open(path.join(self._annots, f"{db}.tabular")).readlines()[1]
-            tag, *_ = dbfile.split("\t")
+            with open(path.join(self._annots, f"{db}.tabular")) as f:
+                next(f)
+                tag, *_ = next(f).split("\t")
             puretag = remove_suffix(tag)
             dbtags.update({puretag : db})
         return dbtags
@@ -322,88 +824,46 @@ class BuildNest:
         A method for building a DataFrame where the common gene name from
         Roary gene presence/absence file is translated to the
         respective common gene name in each database. (hashtable)
+        Each cell holds a list of the gene names in that database, or NaN if there are none.
 
         ...
 
         Process:
             1. Retrieve the locus tags for each database organism (map_tag_db())
-            2. Database tags are given an order (index) so genes can be allocates to their respective database in a list format
-            3. Iterate over the locustag file so for each gene:
-                - search for tags relating to database organisms
-                - save the database organism locus ID for that gene in an ordered list
-            4. Transform into a DataFrame and convert empty strings to np.NaN
-            5. For each database organism:
-                - open their respective annotation file
-                - build a dictionary of locus ID : gene pairs
-                - rename the locus IDs in DataFrame for given database organism to their given gene name
+            2. Stream the locustag file (read_clustered_proteins) into long format:
+                one row of (gene, database organism, locus ID) for each locus relating to a database organism
+            3. Read the annotation file of each database organism (read_annotations) into locus ID : gene pairs
+            4. Join the locus IDs to their gene names, dropping loci without a gene and repeated names
+            5. Collect the gene names of each gene and database organism into a list and pivot into a DataFrame
         """
         dbtags = self._map_tag_db()
-        order = {tag : index for index, tag in enumerate(dbtags.keys())}
-
-        gene_regex = r"^\w+[^_\-\d:]"
-        tag_regex = "|".join([item + r"_\d+" for item in dbtags.keys()])
-
-        # reads the roary file and gets the tags for each gene
-        tidy_locusid = {}
-        for line in open(self._locustags).readlines():
-
-            gene = re.match(gene_regex, line)
-            values = re.findall(tag_regex , line)
-            gene = gene.group(0)
-
-            if gene != "group" and gene in self._accessory.index:
-                row = [''] * len(dbtags) if gene not in tidy_locusid.keys() else tidy_locusid[gene]
-                for locus in values:
-                    idtag = remove_suffix(locus)
-                    index = order[idtag]
-                    if row[index]: 
-                        row[index] += ", " + locus
-                    else:
-                        row[index] = locus
-                tidy_locusid.update({gene : row})
-
-        self._hashtable = pd.DataFrame.from_dict(tidy_locusid, orient='index', columns=dbtags.values())
-        self._hashtable = self._hashtable.replace('', np.NaN)
-
-        # reads the annotation file for each database and renames the locus tags in the main df to the corresponding gene name
-        for db in self._dbs:
-            with open(path.join(self._annots, f"{db}.tabular"), newline='') as f:
-                f_csv = csv.reader(f, delimiter='\t')
-                headings = next(f_csv)
-                Row = namedtuple('Row', headings)
-
-                name_reference = {}
-                for r in f_csv:
-                    row = Row(*r)
-                    if row.gene: # if gene present for locus tag
-                        gene = remove_suffix(row.gene)
-                        name_reference.update({row.locus_tag : gene})
-                    else:
-                        name_reference.update({row.locus_tag : np.NaN})
-
-            def rename(x):
-                LIDs = x.split(", ")
-                names = ""
-                for LID in LIDs:
-                    gene_name = name_reference[LID]
-                    if isinstance(gene_name, float):
-                        continue
-                    elif not names:
-                        names = gene_name
-                    elif gene_name not in names:
-                        names += ", " + gene_name
-                return names if names else np.NaN
-
-            gene_present = self._hashtable[db].notna()
-            self._hashtable.loc[gene_present, db] = self._hashtable.loc[gene_present, db].apply(rename)
-
-        return self._hashtable
+
+        # reads the roary file and gets the locus of each database organism for each gene
+        genes = {}
+        loci = {"gene" : [], "db" : [], "locus" : []}
+        for gene, gene_loci in read_clustered_proteins(self._locustags, dbtags, genes=set(self._accessory.index)):
+            genes[gene] = None
+            for idtag, locus in gene_loci:
+                loci["gene"].append(gene)
+                loci["db"].append(dbtags[idtag])
+                loci["locus"].append(locus)
+        loci = pd.DataFrame(loci, dtype=object)
+
+        # reads the annotation file for each database and renames the locus tags to the corresponding gene name
+        names = pd.concat({db : read_annotations(path.join(self._annots, f"{db}.tabular")) for db in self._dbs},
+                          names=["db", "locus"])
+        loci = loci.join(names, on=["db", "locus"])
+        loci = loci.dropna(subset=["name"]).drop_duplicates(["gene", "db", "name"])
+
+        hashtable = loci.groupby(["gene", "db"], sort=False)["name"].agg(list).unstack("db")
+        return hashtable.reindex(index=list(genes), columns=list(dbtags.values()))
 
     #--------------------------------------------
     #reactions handling
     def _getDBreacs(self, DBname):
         """
         Given a database organism, this function gets all the reactions from its database and returns a dictionary.
+        Reaction maps are read from the reaction cache when the database files are unchanged.
 
             Parameters:
                 DBname (str) : name of database organism
@@ -416,59 +876,81 @@ class BuildNest:
                         values (str) : reaction as ScrumPy
         """
         
-        fp = self._db[DBname]
-        reaction_map = {}
-        with HidePrints():
-            db = PyoCyc.Organism(data="data", Path=fp)
-     
-        UIDs = [gene['UNIQUE-ID'][0] for gene in db.dbs['GENE'].values()]
-        for UID in UIDs:
-            try:
-                gene = db.dbs['GENE'][UID]['COMMON-NAME'][0]
-            except KeyError:
-                gene = False
-            
-            if gene:
-                # try:
-                reactions = db.dbs['GENE'][UID].GetReactions()
-                # except:
-                #     reactions = False
-                
-                if reactions:
-                    r = {reac.UID : reac.AsScrumPy() for reac in reactions if "!" not in reac.AsScrumPy()}
-                    if r:
-                        reaction_map[gene] = r
-        
+        reaction_map = self._from_cache(DBname)
+        if reaction_map is None:
+            reaction_map = _parse_database(self._db[DBname])
+            self._to_cache(DBname, reaction_map)
+        return reaction_map
+
+
+    def _from_cache(self, DBname):
+        "Returns the cached reaction map of a database organism or None."
+        if not self._cache:
+            return None
+        reaction_map = self._cache.load(self._db[DBname])
+        if reaction_map is not None:
+            log.debug(f"Reactions for {DBname} loaded from cache.")
         return reaction_map
+
+
+    def _to_cache(self, DBname, reaction_map):
+        if self._cache:
+            self._cache.store(self._db[DBname], reaction_map)
+
+
+    def _load_databases(self):
+        """
+        Gets the reaction map of every database organism, in the order of self._dbs.
+        Databases missing from the cache are parsed in a process pool when workers > 1.
+        """
+        reaction_maps = {dname : self._from_cache(dname) for dname in self._dbs}
+        missing = [dname for dname, reaction_map in reaction_maps.items() if reaction_map is None]
+
+        if self._workers > 1 and len(missing) > 1:
+            log.info(f"Parsing {len(missing)} databases using {min(self._workers, len(missing))} workers.")
+            with ProcessPoolExecutor(max_workers=min(self._workers, len(missing))) as pool:
+                parsed = pool.map(_parse_database, [self._db[dname] for dname in missing])
+                for dname, reaction_map in zip(missing, parsed):
+                    reaction_maps[dname] = reaction_map
+                    self._to_cache(dname, reaction_map)
+        else:
+            for dname in missing:
+                reaction_maps[dname] = _parse_database(self._db[dname])
+                self._to_cache(dname, reaction_maps[dname])
+
+        return [reaction_maps[dname] for dname in self._dbs]
   
 
-    def _buildMasterReaction(self, dname):
-        """Merges all the genes with reactions from databases, takes database organism name."""
-        reaction_map = self._getDBreacs(dname)
+    def _buildMasterReaction(self, dname, reaction_map=None):
+        """
+        Merges all the genes with reactions from databases, takes database organism name.
+        The database's reaction map is fetched with _getDBreacs unless given.
+        """
+        if reaction_map is None:
+            reaction_map = self._getDBreacs(dname)
         genes_present = self._hashtable[dname].notna()
         dbseries = self._hashtable.loc[genes_present, dname]
-        for index, value in dbseries.items():
+        collisions = []
+        for index, names in dbseries.items():
+            if len(names) > 1:                                                                      # loci with different gene names aren't looked up
+                continue
             try:
-                reactions = reaction_map[value]
+                reactions = reaction_map[names[0]]
             except KeyError:
                 continue
             
+            master = self._reaction_master[index]
             for UID, reaction in reactions.items():
-                if UID in self._reaction_master[index]:
-
-                    if reaction != self._reaction_master[index][UID]:
-
-                        reac_a = split_reaction(self._reaction_master[index][UID])
-                        reac_b = split_reaction(reaction)
-
-                        subs = list_identical(reac_a.substrates, reac_b.substrates)
-                        dirs = str_identical(reac_a.direction, reac_b.direction)
-                        prods = list_identical(reac_a.products, reac_b.products)
-
-                        if not all([subs, dirs, prods]):
-                            self._add_conflict(index, UID, self._reaction_master[index][UID], reaction)
+                if UID in master:
+                    if reaction != master[UID]:
+                        collisions.append((index, UID, master[UID], reaction))
                 else:
-                    self._reaction_master[index].update({UID : reaction})
+                    master[UID] = reaction
+
+        # reactions written differently are only conflicts if their canonical forms differ
+        for index, UID, reac_a, reac_b in collisions:
+            if canonical_reaction(reac_a) != canonical_reaction(reac_b):
+                self._add_conflict(index, UID, reac_a, reac_b)
  
 
     def _add_conflict(self, gene, rUID, reac_a, reac_b):
@@ -511,13 +993,19 @@ class BuildNest:
     #--------------------------------------------
     #egg and model handling
     def _egg_reactions(self, series):
-        "From an egg's series (from inmodel), this generates a dict of reactions which are absent in egg."
-        reactions = {}
-        for gene in series:
-            reacs = self._reaction_master[gene]
-            if reacs:
-                reactions.update(reacs)
-        return reactions
+        """
+        From an egg's series (from inmodel), this returns the reactions which are absent in egg,
+        as arrays of UID and reaction ids in the reaction master, merged by UID.
+        """
+        return self._reaction_master.merged(series)
+
+
+    def _index_model_files(self):
+        "Indexes the model files in the current working directory for every reaction collected from databases."
+        self._model_index = _ModelIndex(getcwd(), self._reaction_master.uids)
+        positions = [self._model_index.position(rUID) for rUID in self._reaction_master.uids]
+        self._model_positions = np.array([-1 if position is None else position for position in positions], dtype=np.int64)
+        log.debug(f"Model files indexed: {', '.join(self._model_index.files)}")
 
 
     def _verify_in_model(self, series):
@@ -525,36 +1013,28 @@ class BuildNest:
         Input: pd.Series.index of egg with genes present but absent in model.
         Returns: Two lists of ScrumPy formatted reactions; [0]reactions in model files, [1]reactions not in model files
         """
-        cwd = getcwd()
-        reactions = self._egg_reactions(series)
-        spy_files = filter(lambda x : x.endswith(".spy"), listdir(cwd))
-        in_model_files = []
+        if self._model_index is None:
+            self._index_model_files()
 
-        for spy_file in spy_files:
-            open_spy = path.join(cwd, spy_file)
+        uid_ids, reaction_ids = self._egg_reactions(series)
+        positions = self._model_positions[uid_ids]
+        found = positions != -1
 
-            with open(open_spy, 'rb', 0) as fspy, \
-                    mmap.mmap(fspy.fileno(), 0, access=mmap.ACCESS_READ) as search_file:
-                
-                for rUID, reaction in reactions.items():
-                    if reaction not in in_model_files and search_file.find(bytes(rUID, encoding='utf8')) != -1:
-                        in_model_files.append(reaction)
-        
-        notin_model_files   = [add_prefix(reaction) for reaction in reactions.values() if reaction not in in_model_files]
-        model_reactions     = [add_prefix(reaction) for reaction in in_model_files]
+        # ordered by the first model file each reaction was found in, as when searching file by file
+        in_model_files = reaction_ids[found][np.argsort(positions[found], kind="stable")]
+
+        notin_model_files   = [add_prefix(reaction) for reaction in self._reaction_master.reactions[reaction_ids[~found]]]
+        model_reactions     = [add_prefix(reaction) for reaction in self._reaction_master.reactions[in_model_files]]
         return model_reactions, notin_model_files
 
 
     def _reactions_to_add(self, series):
-        reacs_to_add = []
-        reacs_with_conflicts = []
-
-        for gene in series:
-            if gene in self._conflicts.keys():
-                reacs_with_conflicts.append(self._conflicts[gene])
-            elif self._reaction_master[gene]:
-                for reaction in self._reaction_master[gene].values():
-                    reacs_to_add.append(reaction)
+        genes = pd.Index(series)
+        conflicted = genes.isin(list(self._conflicts))
+
+        reacs_with_conflicts = [self._conflicts[gene] for gene in genes[conflicted]]
+        _, reaction_ids = self._reaction_master.gather(genes[~conflicted])
+        reacs_to_add = self._reaction_master.reactions[reaction_ids].tolist()
         return reacs_to_add, reacs_with_conflicts
 
     #--------------------------------------------
@@ -22,7 +22,7 @@ import tkinter as tk
 import tkinter.ttk as ttk
 from tkinter.filedialog import askopenfilename
 
-from ..nest import get_path, DIR
+from ..nest import get_path, resolve, DIR
 
 
 class Editor(pyshell.EditorWindow):
@@ -122,8 +122,9 @@ def _ask_spy_file():
 def pick(egg):
     """
     Load an egg into the editor window.
+    An alias opens the egg holding its contents, which is shared by every egg aliasing it.
     """
-    egg_path = get_path(egg)
+    egg_path = resolve(get_path(egg))
     Editor(filename=egg_path)
     
 
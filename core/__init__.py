@@ -1,4 +1,30 @@
-from .Builder import BuildNest
-from .InputHandler import Inputs, read_yaml, read_json
-from .GUI import pick
-from .containers import Nest, Community
\ No newline at end of file
+from importlib import import_module
+
+# imported on first use so building a nest doesn't load tkinter or ScrumPy (see tuatara/__init__.py)
+_exports = {
+    "BuildNest" : ".Builder",
+    "Inputs" :    ".InputHandler",
+    "read_yaml" : ".InputHandler",
+    "read_json" : ".InputHandler",
+    "pick" :      ".GUI",
+    "Nest" :      ".containers",
+    "Community" : ".containers",
+    "merge_shards" : ".shards"
+}
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+__all__ = list(_exports)
@@ -0,0 +1,127 @@
+"""
+Cache module for tuatara.
+
+...
+
+Classes:
+
+    ReactionCache(directory=None, checksum=False)
+
+Functions:
+
+    fingerprint(fp, checksum=False)     -> str
+
+"""
+
+
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+from os import path
+
+from ..nest.keeper import mkstemp
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+CACHE = path.join(
+    path.dirname(path.realpath(__file__)),
+    "cache")
+
+
+def fingerprint(fp, checksum=False) -> str:
+    """
+    Fingerprints a database directory from the name, size and modification time of its .dat files.
+
+        Parameters:
+            fp (str) : database file path
+            checksum (bool) : also hash the contents of each .dat file
+
+        Returns:
+            fingerprint (str) : hex digest
+    """
+    digest = hashlib.sha1(path.abspath(fp).encode())
+    for root, dirs, files in os.walk(fp):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith(".dat"):
+                continue
+            dat = path.join(root, name)
+            stat = os.stat(dat)
+            digest.update(f"{path.relpath(dat, fp)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+            if checksum:
+                with open(dat, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b""):
+                        digest.update(block)
+    return digest.hexdigest()
+
+
+class ReactionCache:
+
+    """
+    An on-disk cache of database reaction maps (see BuildNest._getDBreacs).
+    Entries are keyed by the database path and a fingerprint of its .dat files,
+    so an entry is only used while the database is unchanged.
+
+    ...
+    Parameters:
+        directory (str) : cache directory (default: tuatara/core/cache)
+        checksum (bool) : include file contents in the fingerprint
+
+    Methods
+    -------
+        load(fp)
+        store(fp, reaction_map)
+        clear()
+
+    """
+
+    def __init__(self, directory=None, checksum=False):
+        self.directory = directory or CACHE
+        self.checksum = checksum
+
+
+    def __repr__(self):
+        return f"ReactionCache: {self.directory}"
+
+
+    def _entry(self, fp):
+        return path.join(self.directory, fingerprint(fp, checksum=self.checksum) + ".pkl.gz")
+
+
+    def load(self, fp):
+        """Returns the cached reaction map for a database or None if there isn't one."""
+        entry = self._entry(fp)
+        if not path.isfile(entry):
+            return None
+        try:
+            with gzip.open(entry, 'rb') as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            log.warning(f"Ignoring unreadable cache entry: {entry}")
+            return None
+
+
+    def store(self, fp, reaction_map):
+        """Saves a reaction map for a database."""
+        os.makedirs(self.directory, exist_ok=True)
+        entry = self._entry(fp)
+        fd, tmp = mkstemp(self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                pickle.dump(reaction_map, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, entry)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+    def clear(self):
+        """Removes all cache entries"""
+        if not path.isdir(self.directory):
+            return
+        for entry in os.listdir(self.directory):
+            if entry.endswith(".pkl.gz"):
+                os.remove(path.join(self.directory, entry))
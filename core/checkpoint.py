@@ -0,0 +1,186 @@
+"""
+Checkpoint module for tuatara.
+
+...
+
+Classes:
+
+    Checkpoint(directory, key)
+
+Functions:
+
+    inputs_fingerprint(inputs)  -> str
+
+"""
+
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+from os import path
+
+import numpy as np
+
+from ..nest.keeper import mkstemp
+from .cache import fingerprint
+from .matrix import GeneMatrix
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+CHECKPOINTS = path.join(
+    path.dirname(path.realpath(__file__)),
+    "checkpoints")
+
+# Bump when the contents of a stage change so old checkpoints are not resumed from.
+_CHECKPOINT_VERSION = 3
+
+
+def _stat(fp):
+    try:
+        stat = os.stat(fp)
+    except (OSError, TypeError):
+        return None
+    return [path.abspath(fp), stat.st_size, stat.st_mtime_ns]
+
+
+def inputs_fingerprint(inputs) -> str:
+    """
+    Fingerprints everything BuildNest reads before writing eggs: the roary files, the annotation
+    files of each database organism, the database directories (see cache.fingerprint) and the
+    options given in the inputs.
+
+        Parameters:
+            inputs (obj) : A class object containing all necessary inputs.
+
+        Returns:
+            fingerprint (str) : hex digest
+    """
+    key = {
+        "version" : _CHECKPOINT_VERSION,
+        "model" : inputs.model,
+        "databases" : [[dname, fingerprint(inputs._db_fp[dname])] for dname in inputs.databases],
+        "gpafile" : _stat(inputs.gpafile),
+        "locustags" : _stat(inputs.locustags),
+        "annotations" : [_stat(path.join(inputs.annotations, f"{dname}.tabular")) for dname in inputs.databases],
+        "rename" : inputs._rename,
+        "drop_columns" : inputs._drop_columns
+        }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Checkpoint:
+
+    """
+    Intermediate results of a BuildNest run, saved after each stage so a failed build can resume.
+    Checkpoints are kept in a subdirectory named after the inputs fingerprint, so a checkpoint
+    is only resumed from while the inputs are unchanged.
+
+    GeneMatrix stages are saved as .npz files and everything else is pickled (protocol 5 where available).
+    Eggs are appended to a log as they are written.
+
+    ...
+    Parameters:
+        directory (str) : checkpoint directory (default: tuatara/core/checkpoints)
+        key (str) : inputs fingerprint (see inputs_fingerprint)
+
+    Attributes
+    ----------
+    path : str
+        Directory holding this checkpoint
+
+    Methods
+    -------
+        has(stage)
+        save(stage, obj)
+        load(stage)
+        completed_eggs()
+        record_egg(egg, digest, statement)
+        clear()
+
+    """
+
+    def __init__(self, directory, key):
+        self.directory = directory or CHECKPOINTS
+        self.key = key
+        self.path = path.join(self.directory, key)
+
+
+    def __repr__(self):
+        return f"Checkpoint: {self.path}"
+
+
+    def _file(self, stage, obj=None):
+        npz = path.join(self.path, f"{stage}.npz")
+        if isinstance(obj, GeneMatrix) or (obj is None and path.isfile(npz)):
+            return npz
+        return path.join(self.path, f"{stage}.pkl")
+
+
+    def has(self, stage) -> bool:
+        """True if stage has been saved"""
+        return path.isfile(self._file(stage))
+
+
+    def save(self, stage, obj):
+        """Saves the result of a stage. The file only appears once it is complete."""
+        os.makedirs(self.path, exist_ok=True)
+        fd, tmp = mkstemp(self.path)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                if isinstance(obj, GeneMatrix):
+                    np.savez(f,
+                        bits=obj[list(obj.columns)],
+                        index=obj.index.to_numpy(dtype=str),
+                        columns=obj.columns.to_numpy(dtype=str))
+                else:
+                    pickle.dump(obj, f, protocol=min(5, pickle.HIGHEST_PROTOCOL))
+            os.replace(tmp, self._file(stage, obj))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+    def load(self, stage):
+        """Loads the result of a stage"""
+        fp = self._file(stage)
+        if fp.endswith(".npz"):
+            with np.load(fp) as arrays:
+                return GeneMatrix(arrays["bits"], arrays["index"], arrays["columns"])
+        with open(fp, 'rb') as f:
+            return pickle.load(f)
+
+
+    def completed_eggs(self) -> dict:
+        """
+        Returns the eggs written since the checkpoint was made.
+            key : egg ID
+            value : (digest, statement)
+        """
+        completed = {}
+        try:
+            with open(path.join(self.path, "eggs.jsonl"), 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:                                                              # last line of an interrupted build
+                        continue
+                    completed[entry["egg"]] = (entry["digest"], entry["statement"])
+        except FileNotFoundError:
+            pass
+        return completed
+
+
+    def record_egg(self, egg, digest, statement):
+        """Appends a written egg to the log"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(path.join(self.path, "eggs.jsonl"), 'a') as f:
+            f.write(json.dumps({"egg" : egg, "digest" : digest, "statement" : statement}) + "\n")
+
+
+    def clear(self):
+        """Removes this checkpoint"""
+        shutil.rmtree(self.path, ignore_errors=True)
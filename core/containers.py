@@ -14,7 +14,8 @@ import pandas as pd
 from ScrumPy import Model as ScrumPyModel
 
 # import pickle
-from ..nest.hatcher import hatch
+from ..nest.hatcher import hatch, hatch_many
+from ..nest.keeper import DIR, get_path
 from ..tools.utils import dedupe, flatten
 from ..tools.tuakit import LP
 
@@ -34,6 +35,19 @@ def open_model(model):
         return m
 
 
+def _drop_failed(values, eggs, failed):
+    """
+    Drops the values of eggs which failed to hatch from a list lined up with eggs.
+    The list may start with an entry for the model.
+    """
+    offset = len(values) - len(eggs)
+    if offset not in (0, 1):
+        raise ValueError(f"Expected {len(eggs)} values, one for each egg (and optionally the model), got {len(values)}.")
+    if not failed:
+        return values
+    return list(values[:offset]) + [value for value, egg in zip(values[offset:], eggs) if egg not in failed]
+
+
 class Constructors(ABC):
 
     @abstractclassmethod
@@ -196,8 +210,9 @@ class Nest(dict, Constructors):
     #Constructors
   
     @classmethod
-    def from_file(cls, model, files=None, names=None):
+    def from_file(cls, model, files=None, names=None, workers=1, failed=None):
         m = open_model(model)
+        failed = {} if failed is None else failed                                                   # eggs which fail are logged and left out
 
         if isinstance(files, dict):
             names, files = zip(*files.items())
@@ -205,26 +220,26 @@ class Nest(dict, Constructors):
         elif isinstance(files, str):
             files = [files]
         
-        nest = [hatch(m, fromspy=egg) for egg in files]
+        nest = hatch_many(m, files, fromspy=True, workers=workers, failed=failed)
         nest.insert(0, m)
-        names.insert(0, "model")
+        names = ["model"] + _drop_failed(list(names or files), files, failed)
         return cls(*nest, names=names)
 
 
     @classmethod
-    def from_nest(cls, model, eggs=None):
+    def from_nest(cls, model, eggs=None, egg_dir=None, workers=1, failed=None):
         m = open_model(model)
+        failed = {} if failed is None else failed
 
-        nest = [hatch(m, egg) for egg in eggs]
+        nest = hatch_many(m, eggs, egg_dir=egg_dir, workers=workers, failed=failed)
         nest.insert(0, m)
-        names = eggs
-        names.insert(0, "model")
+        names = ["model"] + _drop_failed(list(eggs), eggs, failed)
         return cls(*nest, names=names)
 
 
     @classmethod
     def from_BuildNest(cls, model, BuildNest):
-        return cls.from_nest(model, eggs=BuildNest.samples)
+        return cls.from_nest(model, eggs=BuildNest.samples, egg_dir=BuildNest.egg_dir)
 
 
     #--------------------------------------------------
@@ -352,19 +367,24 @@ class Community(pd.DataFrame, Constructors):
     #Constructors
 
     @classmethod
-    def from_nest(cls, model, eggs=None, index=None, columns=None, **kwargs):
+    def from_nest(cls, model, eggs=None, index=None, columns=None, egg_dir=None, workers=1, failed=None, **kwargs):
         m = open_model(model)
+        failed = {} if failed is None else failed                                                   # eggs which fail are logged and left out
 
         # try:
-        models = {"model" : [hatch(m, egg) for egg in eggs]}
+        models = {"model" : hatch_many(m, eggs, egg_dir=egg_dir, workers=workers, failed=failed)}
         # except FileNotFoundError:
         #     models = {"model" : [hatch(m, egg[:-4]) for egg in eggs]} #try removing ".spy"
 
         models["model"].insert(0, m)
+        if index:
+            index = _drop_failed(index, eggs, failed)
         if index and index[0] != "model": #should check are equal length?
             index.insert(0, "model")
 
         if columns:
+            columns = {column : _drop_failed(values, eggs, failed) if isinstance(values, list) else values
+                       for column, values in columns.items()}
             arguments = {**models, **columns}
         else:
             arguments = models
@@ -379,7 +399,7 @@ class Community(pd.DataFrame, Constructors):
 
 
     @classmethod
-    def read_file(cls, model, file, delimiter="\n", **kwargs):
+    def read_file(cls, model, file, delimiter="\n", egg_dir=None, workers=1, failed=None, **kwargs):
         m = open_model(model)
         models = [m]
 
@@ -390,20 +410,21 @@ class Community(pd.DataFrame, Constructors):
             for line in open(file).readlines():
                 eggs += [item.strip() for item in line.split(delimiter)]
 
-        for egg in eggs:
-            if not egg:
-                continue
-            elif egg.endswith(".spy"):
-                models.append(hatch(m, fromspy=egg))
-            else:
-                models.append(hatch(m, egg))
+        failed = {} if failed is None else failed                                                   # eggs which fail are logged and left out
+        files = [egg if egg.endswith((".spy", ".spy.gz")) else get_path(egg, directory=egg_dir or DIR) for egg in eggs if egg]
+        models += hatch_many(m, files, fromspy=True, workers=workers, failed=failed)
 
+        if kwargs.get("index"):
+            kwargs["index"] = _drop_failed(kwargs["index"], files, failed)
+        if kwargs.get("columns"):
+            kwargs["columns"] = {column : _drop_failed(values, files, failed) if isinstance(values, list) else values
+                                 for column, values in kwargs["columns"].items()}
         return cls(*models, **kwargs)
 
 
     @classmethod
     def from_BuildNest(cls, model, BuildNest, columns=None):
-        return cls.from_nest(model, eggs=BuildNest.samples, columns=columns)
+        return cls.from_nest(model, eggs=BuildNest.samples, columns=columns, egg_dir=BuildNest.egg_dir)
 
 
     #-----------------------------------------------
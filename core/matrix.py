@@ -0,0 +1,295 @@
+"""
+Gene presence/absence matrix module for tuatara.
+
+...
+
+Classes:
+
+    GeneMatrix(bits, index, columns)
+    GeneSets(indptr, indices, genes, columns)
+
+Functions:
+
+    read_rtab(fp)               -> pd.DataFrame
+    merge_duplicate_genes(gpa)  -> pd.DataFrame
+
+"""
+
+
+import numpy as np
+import pandas as pd
+
+
+def read_rtab(fp):
+    """
+    Reads a Roary gene presence/absence file (Rtab) with one byte per cell.
+
+        Parameters:
+            fp (str) : file path for Rtab file
+
+        Returns:
+            gpa (pd.DataFrame) : genes (index) by isolates (columns) as uint8
+    """
+    with open(fp, encoding='utf-8') as f:
+        header = f.readline().split("\t")
+    dtypes = {column.strip() : np.uint8 for column in header[1:]}
+    return pd.read_table(fp, index_col=0, dtype=dtypes)
+
+
+def merge_duplicate_genes(gpa):
+    """
+    Merges rows of a gene presence/absence DataFrame with duplicated gene names
+    (Roary suffixes such as gene_2) by taking the maximum of each isolate.
+    Genes keep the order of their first appearance.
+
+        Parameters:
+            gpa (pd.DataFrame) : genes (index) by isolates (columns)
+
+        Returns:
+            gpa (pd.DataFrame) : one row per gene name without suffix
+    """
+    if not len(gpa):
+        return gpa.copy()
+
+    # same pattern as tools.utils.remove_suffix, applied to the whole index at once
+    genes = gpa.index.str.extract(r"^(\w+[^_\-\d:])", expand=False)
+    if genes.isna().any():
+        raise ValueError(f"Unexpected gene names: {', '.join(gpa.index[genes.isna()])}")
+
+    codes, uniques = pd.factorize(genes)
+    order = np.argsort(codes, kind="stable")
+    codes = codes[order]
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    merged = np.maximum.reduceat(gpa.to_numpy()[order], starts, axis=0)
+
+    return pd.DataFrame(merged, index=pd.Index(uniques), columns=gpa.columns)
+
+
+class GeneMatrix:
+
+    """
+    A bit-packed gene presence/absence matrix.
+
+    Each isolate is stored as a bitset over the genes, one bit per cell, so masks
+    across isolates are bitwise operations on packed uint8 arrays. Bitsets returned by
+    the matrix can be combined with &, | and ~ before being passed back to it.
+
+    ...
+    Parameters:
+        bits (np.ndarray) : packed uint8 array of shape (isolates, ceil(genes / 8))
+        index (pd.Index) : gene names
+        columns (pd.Index) : isolate names
+
+
+    Attributes
+    ----------
+    index : pd.Index
+        Gene names
+
+    columns : pd.Index
+        Isolate names
+
+    nbytes : int
+        Size of the packed matrix in bytes
+
+
+    Methods
+    -------
+        from_frame(frame)
+        any(columns=None)
+        all(columns=None)
+        count(bitset)
+        mask(bitset)
+        genes(bitset)
+        gene_sets(columns, func)
+        select(bitset)
+        to_frame()
+
+    """
+
+    # number of isolates unpacked at a time when repacking the matrix
+    _chunk = 256
+
+    def __init__(self, bits, index, columns):
+        self._bits = bits
+        self.index = pd.Index(index)
+        self.columns = pd.Index(columns)
+
+
+    def __repr__(self):
+        return f"GeneMatrix: {len(self.index)} genes x {len(self.columns)} isolates ({self.nbytes} bytes)"
+
+
+    def __len__(self):
+        return len(self.index)
+
+
+    def __getitem__(self, columns):
+        """Returns the bitset of an isolate, or a 2D array of bitsets for a list of isolates."""
+        if isinstance(columns, str):
+            return self._bits[self.columns.get_loc(columns)]
+        return self._bits[self._locate(columns)]
+
+
+    @classmethod
+    def from_frame(cls, frame):
+        """Packs a gene presence/absence DataFrame. Any value greater than zero is present."""
+        values = frame.to_numpy()
+        bits = np.empty((values.shape[1], -(-values.shape[0] // 8)), dtype=np.uint8)
+        for start in range(0, values.shape[1], cls._chunk):
+            block = values[:, start:start + cls._chunk] > 0
+            bits[start:start + cls._chunk] = np.packbits(block.T, axis=1)
+        return cls(bits, frame.index, frame.columns)
+
+
+    @property
+    def shape(self):
+        return len(self.index), len(self.columns)
+
+
+    @property
+    def nbytes(self):
+        return self._bits.nbytes
+
+
+    def _locate(self, columns):
+        locs = self.columns.get_indexer(columns)
+        if (locs == -1).any():
+            missing = [column for column, loc in zip(columns, locs) if loc == -1]
+            raise KeyError(f"Not found in matrix: {', '.join(missing)}")
+        return locs
+
+
+    def _reduce(self, ufunc, columns, identity):
+        bits = self._bits if columns is None else self._bits[self._locate(columns)]
+        if not len(bits):
+            return np.full(self._bits.shape[1], identity, dtype=np.uint8)
+        return ufunc.reduce(bits, axis=0)
+
+
+    def any(self, columns=None):
+        """Bitset of genes present in any of the given isolates (default: all isolates)."""
+        return self._reduce(np.bitwise_or, columns, 0)
+
+
+    def all(self, columns=None):
+        """Bitset of genes present in all of the given isolates (default: all isolates)."""
+        return self._reduce(np.bitwise_and, columns, 255)
+
+
+    def mask(self, bitset):
+        """Unpacks a bitset into a boolean array over genes."""
+        return np.unpackbits(bitset, count=len(self.index)).view(bool)
+
+
+    def count(self, bitset) -> int:
+        """Number of genes set in a bitset"""
+        return int(np.count_nonzero(self.mask(bitset)))
+
+
+    def genes(self, bitset):
+        """Returns the gene names set in a bitset"""
+        return self.index[self.mask(bitset)]
+
+
+    def gene_sets(self, columns, func):
+        """
+        Finds a set of genes for many isolates at once.
+
+            Parameters:
+                columns (list) : isolates
+                func (callable) : takes a 2D array of the isolates' bitsets and returns the
+                    bitsets of the genes wanted for each isolate, e.g. lambda bits: model & ~bits
+
+            Returns:
+                gene_sets (GeneSets) : the genes of each isolate
+        """
+        locs = self._locate(columns)
+        indptr = np.zeros(len(locs) + 1, dtype=np.int64)
+        indices = []
+        for start in range(0, len(locs), self._chunk):
+            bits = func(self._bits[locs[start:start + self._chunk]])
+            nonzero = np.flatnonzero(bits)                                                          # only bytes with a gene set are unpacked
+            set_bits = np.flatnonzero(np.unpackbits(bits.ravel()[nonzero]))
+            rows, cols = np.divmod(nonzero[set_bits >> 3], bits.shape[1])
+            genes = cols * 8 + (set_bits & 7)
+            padding = genes >= len(self.index)
+            if padding.any():
+                rows, genes = rows[~padding], genes[~padding]
+            indptr[start + 1:start + 1 + len(bits)] = np.bincount(rows, minlength=len(bits))
+            indices.append(genes)
+        indices = np.concatenate(indices) if indices else np.empty(0, dtype=np.intp)
+        return GeneSets(np.cumsum(indptr), indices, self.index, columns)
+
+
+    def select(self, bitset):
+        """Returns a new GeneMatrix of only the genes set in a bitset."""
+        keep = self.mask(bitset)
+        bits = np.empty((len(self.columns), -(-int(keep.sum()) // 8)), dtype=np.uint8)
+        for start in range(0, len(self.columns), self._chunk):
+            block = np.unpackbits(self._bits[start:start + self._chunk], axis=1, count=len(self.index))
+            bits[start:start + self._chunk] = np.packbits(block[:, keep], axis=1)
+        return self.__class__(bits, self.index[keep], self.columns)
+
+
+    def to_frame(self):
+        """Unpacks the matrix into a boolean DataFrame of genes by isolates."""
+        values = np.unpackbits(self._bits, axis=1, count=len(self.index)).view(bool)
+        return pd.DataFrame(values.T, index=self.index, columns=self.columns)
+
+
+class GeneSets:
+
+    """
+    A set of genes for each of several isolates, stored sparsely (CSR) as the positions of
+    the genes of every isolate one after another.
+
+    ...
+    Parameters:
+        indptr (np.ndarray) : genes of isolate i are indices[indptr[i]:indptr[i + 1]]
+        indices (np.ndarray) : positions of genes in genes
+        genes (pd.Index) : gene names
+        columns (list) : isolate names
+
+
+    Methods
+    -------
+        positions(column)
+        count(column)
+
+    """
+
+    def __init__(self, indptr, indices, genes, columns):
+        self._indptr = indptr
+        self._indices = indices
+        self._genes = pd.Index(genes)
+        self._rows = {column : row for row, column in enumerate(columns)}
+
+
+    def __repr__(self):
+        return f"GeneSets: {len(self._rows)} isolates, {len(self._indices)} genes"
+
+
+    def __len__(self):
+        return len(self._rows)
+
+
+    def __contains__(self, column):
+        return column in self._rows
+
+
+    def positions(self, column):
+        """Positions of the genes of an isolate"""
+        row = self._rows[column]
+        return self._indices[self._indptr[row]:self._indptr[row + 1]]
+
+
+    def count(self, column) -> int:
+        """Number of genes of an isolate"""
+        row = self._rows[column]
+        return int(self._indptr[row + 1] - self._indptr[row])
+
+
+    def __getitem__(self, column):
+        """Returns the gene names of an isolate"""
+        return self._genes[self.positions(column)]
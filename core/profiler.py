@@ -0,0 +1,148 @@
+"""
+Profiling module for tuatara.
+
+...
+
+Classes:
+
+    Profiler(memory=False, callback=None)
+
+"""
+
+
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+class Profiler:
+
+    """
+    Records wall time, CPU time and (optionally) peak memory of the stages of a build
+    and of each egg written. Used by BuildNest, see BuildNest.profile.
+
+    Peak memory is measured with tracemalloc, which slows Python down considerably, so it
+    is only recorded when memory is True. Peaks are the most memory traced while a stage ran,
+    including memory allocated before it started. Before Python 3.9 (no tracemalloc.reset_peak)
+    tracing is restarted instead, so peaks only count memory allocated since the last measurement began.
+
+    ...
+    Parameters:
+        memory (bool) : record peak memory with tracemalloc
+        callback (callable) : called as callback(kind, name, record) after each stage ("stage")
+            and egg ("egg") is recorded
+
+    Attributes
+    ----------
+    stages : dict
+        key : stage name
+        value : dict of wall (s), cpu (s) and peak (bytes, None unless memory is True)
+
+    eggs : dict
+        key : egg ID
+        value : dict of wall (s), cpu (s) and peak (bytes, None unless memory is True)
+
+    Methods
+    -------
+        stage(name)
+        egg(name)
+        report()
+        to_json(fp=None)
+
+    """
+
+    def __init__(self, memory=False, callback=None):
+        self.memory = memory
+        self.callback = callback
+        self.stages = {}
+        self.eggs = {}
+        self._peaks = []
+
+
+    def __repr__(self):
+        return "Profiler: " + ", ".join(f"{name} {record['wall']:.3f}s" for name, record in self.stages.items())
+
+
+    def __getstate__(self):
+        # sent to worker processes, which return their own records
+        state = self.__dict__.copy()
+        state.update(callback=None, stages={}, eggs={}, _peaks=[])
+        return state
+
+
+    def _traced_peak(self):
+        "Updates the running peak of every open measurement and starts a new peak."
+        _, peak = tracemalloc.get_traced_memory()
+        self._peaks = [max(running, peak) for running in self._peaks]
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.stop()
+            tracemalloc.start()
+        return peak
+
+
+    @contextmanager
+    def _measure(self, records, kind, name):
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            self._traced_peak()
+            self._peaks.append(0)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            record = {
+                "wall" : time.perf_counter() - wall,
+                "cpu" : time.process_time() - cpu,
+                "peak" : None
+                }
+            if self.memory:
+                self._traced_peak()
+                record["peak"] = self._peaks.pop()
+            records[name] = record
+            if self.callback is not None:
+                self.callback(kind, name, record)
+
+
+    def stage(self, name):
+        """Context manager recording a build stage."""
+        return self._measure(self.stages, "stage", name)
+
+
+    def egg(self, name):
+        """Context manager recording the writing of an egg."""
+        return self._measure(self.eggs, "egg", name)
+
+
+    def report(self) -> dict:
+        """Returns the recorded stages and eggs with the total wall and CPU time of all stages."""
+        return {
+            "memory" : self.memory,
+            "total" : {
+                "wall" : sum(record["wall"] for record in self.stages.values()),
+                "cpu" : sum(record["cpu"] for record in self.stages.values())
+                },
+            "stages" : self.stages,
+            "eggs" : self.eggs
+            }
+
+
+    def to_json(self, fp=None):
+        """
+        Exports the report as JSON.
+
+            Parameters:
+                fp (str) : file path to write to (optional)
+
+            Returns:
+                report (str) : the report as a JSON string
+        """
+        report = json.dumps(self.report(), indent=4)
+        if fp:
+            with open(fp, 'w') as f:
+                f.write(report)
+        return report
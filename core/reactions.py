@@ -0,0 +1,151 @@
+"""
+Reactions module for tuatara.
+
+...
+
+Classes:
+
+    ReactionTable(genes, indptr, uid_ids, reaction_ids, uids, reactions)
+
+"""
+
+
+import numpy as np
+import pandas as pd
+
+
+class ReactionTable:
+
+    """
+    A compact, array-backed record of the reactions of each gene (see BuildNest._reaction_master).
+
+    Reaction unique IDs and ScrumPy reactions are interned, so each string is stored once
+    however many genes and databases share it. The reactions of each gene are stored CSR style:
+    the (UID, reaction) pairs of gene i are entries indptr[i] to indptr[i + 1].
+
+    ...
+    Parameters:
+        genes (pd.Index) : gene names
+        indptr (np.ndarray) : first entry of each gene, and the number of entries
+        uid_ids (np.ndarray) : UID of each entry as a position in uids
+        reaction_ids (np.ndarray) : reaction of each entry as a position in reactions
+        uids (np.ndarray) : reaction unique IDs
+        reactions (np.ndarray) : ScrumPy reactions
+
+
+    Attributes
+    ----------
+    genes : pd.Index
+        Gene names
+
+    uids : np.ndarray
+        Interned reaction unique IDs
+
+    reactions : np.ndarray
+        Interned ScrumPy reactions
+
+
+    Methods
+    -------
+        from_dict(master)
+        items(gene)
+        counts(genes)
+        gather(genes)
+        merged(genes)
+
+    """
+
+    def __init__(self, genes, indptr, uid_ids, reaction_ids, uids, reactions):
+        self.genes = pd.Index(genes)
+        self._indptr = indptr
+        self._uid_ids = uid_ids
+        self._reaction_ids = reaction_ids
+        self.uids = uids
+        self.reactions = reactions
+
+
+    def __repr__(self):
+        return f"ReactionTable: {len(self.genes)} genes, {len(self)} gene reactions ({len(self.reactions)} unique)"
+
+
+    def __len__(self):
+        return len(self._uid_ids)
+
+
+    @classmethod
+    def from_dict(cls, master):
+        """
+        Builds a table from a dictionary of reactions for each gene.
+
+            Parameters:
+                master (dict) :
+                    keys (str) : gene name
+                    values (dict) :
+                        keys (str) : reaction unique ID
+                        values (str) : reaction as ScrumPy
+        """
+        uids = {}
+        reactions = {}
+        indptr = np.zeros(len(master) + 1, dtype=np.int64)
+        uid_ids = []
+        reaction_ids = []
+        for row, gene_reactions in enumerate(master.values(), start=1):
+            indptr[row] = len(gene_reactions)
+            for uid, reaction in gene_reactions.items():
+                uid_ids.append(uids.setdefault(uid, len(uids)))
+                reaction_ids.append(reactions.setdefault(reaction, len(reactions)))
+
+        return cls(
+            list(master),
+            np.cumsum(indptr),
+            np.array(uid_ids, dtype=np.int32),
+            np.array(reaction_ids, dtype=np.int32),
+            np.array(list(uids), dtype=object),
+            np.array(list(reactions), dtype=object))
+
+
+    def _rows(self, genes):
+        rows = self.genes.get_indexer(genes)
+        if (rows == -1).any():
+            raise KeyError(f"Not found in reaction table: {', '.join(pd.Index(genes)[rows == -1])}")
+        return rows
+
+
+    def _entries(self, genes):
+        "Positions of the entries of genes, in gene order."
+        rows = self._rows(genes)
+        starts = self._indptr[rows]
+        lengths = self._indptr[rows + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+
+    def items(self, gene):
+        """Returns the (UID, reaction) pairs of a gene."""
+        entries = self._entries([gene])
+        return list(zip(self.uids[self._uid_ids[entries]], self.reactions[self._reaction_ids[entries]]))
+
+
+    def counts(self, genes):
+        """Returns the number of reactions of each gene."""
+        rows = self._rows(genes)
+        return self._indptr[rows + 1] - self._indptr[rows]
+
+
+    def gather(self, genes):
+        """Returns the UID and reaction ids of every reaction of genes, in gene order."""
+        entries = self._entries(genes)
+        return self._uid_ids[entries], self._reaction_ids[entries]
+
+
+    def merged(self, genes):
+        """
+        Returns the UID and reaction ids of the reactions of genes merged by UID, like updating a
+        dictionary gene by gene: each UID keeps its first position and the reaction of its last gene.
+        """
+        uid_ids, reaction_ids = self.gather(genes)
+        _, first = np.unique(uid_ids, return_index=True)
+        _, last = np.unique(uid_ids[::-1], return_index=True)
+        last = len(uid_ids) - 1 - last
+        order = np.argsort(first, kind="stable")
+        return uid_ids[first[order]], reaction_ids[last[order]]
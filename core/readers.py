@@ -0,0 +1,66 @@
+"""
+Readers module for tuatara.
+
+...
+
+Functions:
+
+    read_clustered_proteins(fp, tags, genes=None)   -> generator
+    read_annotations(fp)                            -> pd.Series
+
+"""
+
+
+import pandas as pd
+
+from ..tools.utils import remove_suffix
+
+
+def read_clustered_proteins(fp, tags, genes=None):
+    """
+    Streams a Roary clustered proteins file one line at a time.
+
+    Each line is split into the cluster's gene name and its locus tags once. A locus
+    belongs to a tag when it is written as <tag>_<number>, which is found with a dictionary
+    lookup of the text before its last underscore.
+
+        Parameters:
+            fp (str) : file path for Roary "Clustered proteins file"
+            tags (dict|set) : locus tag prefixes to keep (e.g. from BuildNest._map_tag_db)
+            genes (set) : only yield these genes, without Roary suffixes (default: all genes except groups)
+
+        Yields:
+            gene (str) : gene name without Roary suffix
+            loci (list) : (tag, locus) pairs in the order they appear on the line
+    """
+    with open(fp, 'r') as f:
+        for line in f:
+            name, _, line_loci = line.partition(":")
+            gene = remove_suffix(name)
+            if gene == "group" or (genes is not None and gene not in genes):
+                continue
+
+            loci = []
+            for locus in line_loci.split():
+                tag, _, number = locus.rpartition("_")
+                if tag in tags and number.isdigit():
+                    loci.append((tag, locus))
+            yield gene, loci
+
+
+def read_annotations(fp):
+    """
+    Reads the gene name of each locus from a Prokka annotation file in tabular format.
+    Gene names have their Roary suffix removed, the same as tools.utils.remove_suffix.
+
+        Parameters:
+            fp (str) : file path for annotation (.tabular) file
+
+        Returns:
+            names (pd.Series) : gene name (NaN if the locus has no gene) indexed by locus tag.
+                When a locus tag is repeated the last row is used.
+    """
+    table = pd.read_table(fp, usecols=["locus_tag", "gene"], dtype=str, keep_default_na=False)
+    names = table["gene"].str.extract(r"^(\w+[^_\-\d:])", expand=False)
+    names = pd.Series(names.to_numpy(), index=pd.Index(table["locus_tag"], name="locus"), name="name")
+    return names[~names.index.duplicated(keep="last")]
@@ -0,0 +1,114 @@
+"""
+Shards module for tuatara.
+
+...
+
+A large nest can be built by several machines at once. Each runs BuildNest with the same
+inputs, checkpoint_dir and egg_dir (on shared storage) and its own shard="i/N", and writes
+the eggs of its shard only. The stages before the eggs are written are loaded from the
+shared checkpoint when present, so running one BuildNest(inputs, debug=True) first means
+every shard starts from the same accessory genome and reaction table.
+Each shard's statements and profile are exported with BuildNest.export and combined with merge_shards.
+
+Functions:
+
+    parse_shard(shard)          -> tuple
+    in_shard(egg, shard)        -> bool
+    merge_shards(reports)       -> dict
+
+"""
+
+
+import json
+import zlib
+
+
+def parse_shard(shard):
+    """
+    Reads a shard given as "i/N" or (i, N), where i counts from 0 to N - 1.
+
+        Parameters:
+            shard (str|tuple) : shard index and number of shards
+
+        Returns:
+            shard (tuple) : (index, count)
+    """
+    try:
+        index, count = shard.split("/") if isinstance(shard, str) else shard
+        index, count = int(index), int(count)
+    except (TypeError, ValueError):
+        raise ValueError(f"Expected shard as 'i/N', got: {shard!r}") from None
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Shard index must be between 0 and {count - 1}, got: {shard!r}")
+    return index, count
+
+
+def in_shard(egg, shard) -> bool:
+    """True if egg belongs to shard (index, count). Eggs are assigned by a CRC32 of their ID, so every machine agrees."""
+    index, count = shard
+    return zlib.crc32(egg.encode()) % count == index
+
+
+def _read(report):
+    if isinstance(report, dict):
+        return report
+    with open(report, 'r') as f:
+        return json.load(f)
+
+
+def merge_shards(reports) -> dict:
+    """
+    Combines the exported reports of each shard of a build (see BuildNest.export).
+
+        Parameters:
+            reports (list) : reports (dict) or file paths to them
+
+        Returns:
+            merged (dict) :
+                shards (list) : (index, count) of each shard merged
+                eggs (dict) : statement of every egg
+                skipped (list) : eggs left as they were by incremental builds
+                aliases (dict) : eggs stored as an alias (key : alias, value : egg)
+                profile (dict) :
+                    total : wall (s) of the slowest shard and cpu (s) of all shards
+                    stages : per stage, the wall (s) of the slowest shard and cpu (s) of all shards
+                    eggs : profile of every egg
+                    shards : the total of each shard
+    """
+    reports = sorted((_read(report) for report in reports), key=lambda report: report["shard"][0])
+    if not reports:
+        raise ValueError("No shard reports given.")
+    shards = [tuple(report["shard"]) for report in reports]
+    counts = {count for _, count in shards}
+    if len(counts) > 1:
+        raise ValueError(f"Reports are from builds with different numbers of shards: {sorted(counts)}")
+    if len(set(shards)) < len(shards):
+        raise ValueError("The same shard is given more than once.")
+    missing = set(range(counts.pop())) - {index for index, _ in shards}
+    if missing:
+        raise ValueError(f"Missing shards: {', '.join(map(str, sorted(missing)))}")
+
+    merged = {"shards" : shards, "eggs" : {}, "skipped" : [], "aliases" : {}}
+    stages = {}
+    eggs = {}
+    for report in reports:
+        merged["eggs"].update(report["eggs"])
+        merged["skipped"] += report["skipped"]
+        merged["aliases"].update(report["aliases"])
+        for name, record in report["profile"]["stages"].items():
+            stage = stages.setdefault(name, {"wall" : 0.0, "cpu" : 0.0})
+            stage["wall"] = max(stage["wall"], record["wall"])
+            stage["cpu"] += record["cpu"]
+        eggs.update(report["profile"]["eggs"])
+
+    totals = [report["profile"]["total"] for report in reports]
+    merged["profile"] = {
+        "total" : {
+            "wall" : max(total["wall"] for total in totals),
+            "cpu" : sum(total["cpu"] for total in totals)
+            },
+        "stages" : stages,
+        "eggs" : eggs,
+        "shards" : totals
+        }
+    return merged
@@ -1,2 +1,4 @@
-from .keeper import get_path, check_egg_exists, Eggs, DIR
-from .hatcher import hatch
\ No newline at end of file
+from .keeper import get_path, check_egg_exists, resolve, Eggs, DIR
+from .hatcher import hatch, hatch_many
+from .delta import DeltaModel
+from .cache import egg_cache
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+Egg cache module for tuatara.
+
+...
+
+Classes:
+
+    EggCache(max_bytes=256 MiB)
+
+Attributes:
+
+    egg_cache : the EggCache used by hatch
+
+"""
+
+
+import sys
+import threading
+from collections import OrderedDict
+from os import path, stat
+
+
+def _sizeof(contents) -> int:
+    "Approximate memory held by the parsed contents of an egg (see hatcher._parse_file)."
+    reactions, removals = contents
+    size = sys.getsizeof(reactions) + sys.getsizeof(removals) + sum(map(sys.getsizeof, removals))
+    for reaction in reactions:
+        size += sys.getsizeof(reaction) + sys.getsizeof(reaction.name) + sys.getsizeof(reaction.StoMat)
+        size += sum(sys.getsizeof(metabolite) for metabolite in reaction.StoMat)
+    return size
+
+
+class EggCache:
+
+    """
+    A least recently used cache of parsed eggs (the reactions to add and remove), so hatching
+    the same egg again doesn't re-read its .spy file. Entries are keyed by file path and are
+    only used while the file's modification time and size are unchanged. The file an alias
+    points to is cached the same way (see resolve).
+
+    The cache holds at most max_bytes (estimated with sys.getsizeof); the least recently used
+    eggs are dropped to make room. Eggs larger than max_bytes are not cached, so setting
+    max_bytes to 0 turns the cache off.
+
+    ...
+    Parameters:
+        max_bytes (int) : memory budget in bytes (default: 256 MiB)
+
+    Attributes
+    ----------
+    max_bytes : int
+        Memory budget in bytes
+
+    hits : int
+        Number of eggs served from the cache
+
+    misses : int
+        Number of eggs parsed
+
+    Methods
+    -------
+        get(egg_path, parse)
+        resolve(egg_path, resolve)
+        stats()
+        clear()
+
+    """
+
+    def __init__(self, max_bytes=256 << 20):
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()                                                               # path : (stamp, size, contents)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+    def __repr__(self):
+        return f"EggCache: {len(self)} eggs, {self.bytes / (1 << 20):.1f} of {self._max_bytes / (1 << 20):.1f} MiB, {self.hits} hits, {self.misses} misses"
+
+
+    def __len__(self):
+        return sum(isinstance(key, str) for key in self._entries)
+
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes
+
+    @max_bytes.setter
+    def max_bytes(self, value):
+        with self._lock:
+            self._max_bytes = value
+            self._evict()
+
+
+    def _evict(self):
+        while self.bytes > self._max_bytes:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+
+    def resolve(self, egg_path, resolve):
+        """
+        Returns the file holding the contents of an egg file, calling resolve(egg_path) when the
+        file isn't cached or has changed since it was, so a cached alias (or egg) is followed
+        without reading it. Not counted in hits and misses.
+
+            Parameters:
+                egg_path (str) : .spy or .spy.gz file path
+                resolve (callable) : returns the file an egg file's contents are in (see keeper.resolve)
+
+            Returns:
+                egg_path (str) : path of the file holding the egg's contents
+        """
+        key = ("resolve", path.abspath(egg_path))
+        file_stat = stat(key[1])
+        stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        resolved = resolve(egg_path)
+        size = sys.getsizeof(key[1]) + sys.getsizeof(resolved)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            if size <= self._max_bytes:
+                self._entries[key] = (stamp, size, resolved)
+                self.bytes += size
+                self._evict()
+        return resolved
+
+
+    def get(self, egg_path, parse):
+        """
+        Returns the parsed contents of an egg file, calling parse(egg_path) when the file
+        isn't cached or has changed since it was.
+
+            Parameters:
+                egg_path (str) : .spy or .spy.gz file path
+                parse (callable) : returns (reactions, removals) for an egg file
+
+            Returns:
+                contents (tuple) : (reactions, removals). Shared between callers, so don't modify.
+        """
+        key = path.abspath(egg_path)
+        file_stat = stat(key)
+        stamp = (file_stat.st_mtime_ns, file_stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        reactions, removals = parse(egg_path)
+        contents = (tuple(reactions), tuple(removals))
+        size = _sizeof(contents)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[1]
+            if size <= self._max_bytes:
+                self._entries[key] = (stamp, size, contents)
+                self.bytes += size
+                self._evict()
+        return contents
+
+
+    def stats(self) -> dict:
+        """Returns the number of hits, misses and evictions, the hit rate and the memory used."""
+        lookups = self.hits + self.misses
+        return {
+            "hits" : self.hits,
+            "misses" : self.misses,
+            "hit_rate" : self.hits / lookups if lookups else 0.0,
+            "evictions" : self.evictions,
+            "eggs" : len(self),
+            "bytes" : self.bytes,
+            "max_bytes" : self._max_bytes
+            }
+
+
+    def clear(self):
+        """Empties the cache and resets its statistics"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+
+egg_cache = EggCache()
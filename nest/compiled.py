@@ -0,0 +1,198 @@
+"""
+Compiled egg module for tuatara.
+
+...
+
+A compiled egg (.spyc) holds the parsed contents of an egg's .spy file (see hatcher._parse_file)
+so hatch can load it with a single read instead of tokenising the text. The .spy file stays the
+human-editable source: a compiled egg records the modification time and size of the .spy file it
+was compiled from and is only used while they match.
+
+Layout:
+
+    MAGIC (8 bytes) | header length (uint32) | header (JSON) | arrays (8 byte aligned)
+
+The header records the source .spy file's stamp, the number of strings in each string table, and
+the dtype, offset and length of each array:
+
+    names           reaction names, joined with newlines (utf-8)
+    metabolites     interned metabolite names, joined with newlines (utf-8)
+    removals        IDs of reactions to remove, joined with newlines (utf-8)
+    indptr          first stoichiometry entry of each reaction, and the number of entries
+    metabolite_ids  metabolite of each entry as a position in metabolites
+    coefficients    stoichiometric coefficient of each entry
+    directions      direction of each reaction as a position in DIRECTIONS
+
+Functions:
+
+    compiled_path(egg_path)                     -> str
+    source_stamp(egg_path)                      -> list
+    write_compiled(fp, contents, stamp)
+    read_compiled(fp, stamp=None)               -> tuple|None
+    read_source(fp)                             -> list|None
+
+"""
+
+
+import json
+import os
+import struct
+from collections import namedtuple
+from os import path
+
+import numpy as np
+
+from .keeper import mkstemp
+
+MAGIC = b"TUASPYC1"
+DIRECTIONS = ("->", "<>", "<-")
+
+StoDict = namedtuple("StoDict", ["name", "StoMat", "direction"])
+
+
+def compiled_path(egg_path) -> str:
+    """Returns the .spyc file path of a .spy or .spy.gz file."""
+    for extension in (".spy.gz", ".spy"):
+        if egg_path.endswith(extension):
+            return egg_path[:-len(extension)] + ".spyc"
+    return egg_path + ".spyc"
+
+
+def source_stamp(egg_path) -> list:
+    """Modification time (ns) and size of an egg file."""
+    stat = os.stat(egg_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _strings(values):
+    return np.frombuffer("\n".join(values).encode(), dtype=np.uint8)
+
+
+def write_compiled(fp, contents, stamp):
+    """
+    Writes the parsed contents of an egg to a compiled egg file.
+    The file is replaced with an atomic rename so readers never see it half written.
+
+        Parameters:
+            fp (str) : .spyc file path
+            contents (tuple) : (reactions, removals) as returned by hatcher._parse_file
+            stamp (list) : source_stamp of the .spy file the contents were parsed from
+    """
+    reactions, removals = contents
+    metabolites = {}
+    metabolite_ids = []
+    coefficients = []
+    indptr = np.zeros(len(reactions) + 1, dtype=np.int64)
+    for row, reaction in enumerate(reactions, start=1):
+        indptr[row] = len(reaction.StoMat)
+        for metabolite, coefficient in reaction.StoMat.items():
+            metabolite_ids.append(metabolites.setdefault(metabolite, len(metabolites)))
+            coefficients.append(coefficient)
+
+    arrays = {
+        "names" : _strings(reaction.name for reaction in reactions),
+        "metabolites" : _strings(metabolites),
+        "removals" : _strings(removals),
+        "indptr" : np.cumsum(indptr),
+        "metabolite_ids" : np.array(metabolite_ids, dtype=np.int32),
+        "coefficients" : np.array(coefficients, dtype=np.int64),
+        "directions" : np.array([DIRECTIONS.index(reaction.direction) for reaction in reactions], dtype=np.uint8)
+        }
+
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // 8) * 8
+    header = json.dumps({
+        "source" : list(stamp),
+        "counts" : [len(reactions), len(metabolites), len(removals)],
+        "arrays" : layout
+        }).encode()
+    header += b" " * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    directory = path.dirname(fp) or "."
+    fd, tmp = mkstemp(directory, prefix=f".{path.basename(fp)}.")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC + struct.pack("<I", len(header)) + header)
+            for array in arrays.values():
+                f.write(array.tobytes())
+                f.write(b"\0" * (-array.nbytes % 8))
+        os.replace(tmp, fp)
+    except BaseException:
+        if path.isfile(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _read_header(f):
+    "Reads the header of an open compiled egg file, None if it isn't one."
+    if f.read(len(MAGIC)) != MAGIC:
+        return None
+    (length,) = struct.unpack("<I", f.read(4))
+    return json.loads(f.read(length))
+
+
+def read_source(fp):
+    """
+    Returns the source_stamp of the .spy file a compiled egg was compiled from, reading only
+    its header. None if the file can't be read or isn't a compiled egg.
+    """
+    try:
+        with open(fp, 'rb') as f:
+            header = _read_header(f)
+    except OSError:
+        return None
+    return header["source"] if header else None
+
+
+def _split(array, count):
+    return array.tobytes().decode().split("\n") if count else []
+
+
+def read_compiled(fp, stamp=None):
+    """
+    Reads a compiled egg file with a single read.
+
+        Parameters:
+            fp (str) : .spyc file path
+            stamp (list) : source_stamp of the .spy file; the compiled egg is only returned if it was compiled from it
+
+        Returns:
+            contents (tuple|None) : (reactions, removals) as returned by hatcher._parse_file,
+                or None if the file isn't a compiled egg or is out of date
+    """
+    try:
+        with open(fp, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return None
+    if data[:len(MAGIC)] != MAGIC:
+        return None
+
+    (length,) = struct.unpack_from("<I", data, len(MAGIC))
+    start = len(MAGIC) + 4
+    header = json.loads(data[start:start + length])
+    if stamp is not None and header["source"] != list(stamp):
+        return None
+
+    start += length
+    arrays = {
+        name : np.frombuffer(data, dtype=dtype, count=count, offset=start + offset)
+        for name, (dtype, offset, count) in header["arrays"].items()
+        }
+    reaction_count, metabolite_count, removal_count = header["counts"]
+    names = _split(arrays["names"], reaction_count)
+    metabolites = _split(arrays["metabolites"], metabolite_count)
+    removals = _split(arrays["removals"], removal_count)
+
+    indptr = arrays["indptr"].tolist()
+    entries = [metabolites[index] for index in arrays["metabolite_ids"].tolist()]
+    coefficients = arrays["coefficients"].tolist()
+    directions = [DIRECTIONS[index] for index in arrays["directions"].tolist()]
+    reactions = [
+        StoDict(name, dict(zip(entries[first:last], coefficients[first:last])), direction)
+        for name, first, last, direction in zip(names, indptr, indptr[1:], directions)
+        ]
+    return reactions, removals
@@ -0,0 +1,293 @@
+"""
+Delta model module for tuatara.
+
+...
+
+A hatched egg differs from its model by a few added and removed reactions. A DeltaModel keeps
+only those differences and composes the model's stoichiometry views with them when they are
+used, so many eggs hatched from one model cost about one model plus their deltas, and the
+model keeps its own reactions (see hatch(..., delta=True) and hatch_many).
+
+Classes:
+
+    DeltaModel(base, reactions=(), removals=())
+    DeltaStoMat(model, matrix)
+
+"""
+
+
+from .compiled import StoDict
+
+
+class DeltaStoMat:
+
+    """
+    A read-only view of a model's stoichiometry matrix (sm or smx) with the reactions of a
+    DeltaModel added and removed. Reaction and metabolite names are worked out the first time
+    they are used. Anything else is looked up on the materialised model (see DeltaModel.materialise).
+
+    ...
+    Parameters:
+        model (DeltaModel) : model the view belongs to
+        matrix (str) : name of the base model's stoichiometry matrix (sm or smx)
+
+    Attributes
+    ----------
+    cnames : list
+        Reaction names
+
+    rnames : list
+        Metabolite names
+
+    Methods
+    -------
+        InvolvedWith(name)
+        Reactants(reaction)
+        Products(reaction)
+        ReacToStr(reaction)
+        Connectedness(metabolite)
+        NewReaction(name, StoMat, direction)
+
+    """
+
+    def __init__(self, model, matrix):
+        self._model = model
+        self._matrix = matrix
+        self._cnames = None
+        self._rnames = None
+        self._base_cnames = None
+        self._base_rnames = None
+
+
+    def __repr__(self):
+        return f"DeltaStoMat: {len(self.rnames)} metabolites, {len(self.cnames)} reactions"
+
+
+    def __getattr__(self, attr):
+        if attr.startswith("_"):
+            raise AttributeError(attr)
+        return getattr(getattr(self._model.materialise(), self._matrix), attr)
+
+
+    @property
+    def _base(self):
+        "The base model's matrix, looked up each time as Init replaces it (see DeltaModel.materialise)."
+        return getattr(self._model.base, self._matrix)
+
+
+    def _in_base(self, name):
+        "True if name is a reaction of the base model, False if it is a metabolite, None if neither."
+        if self._base_cnames is None:
+            self._base_cnames = set(self._base.cnames)
+            self._base_rnames = set(self._base.rnames)
+        if name in self._base_cnames:
+            return True
+        return False if name in self._base_rnames else None
+
+
+    @property
+    def cnames(self):
+        if self._cnames is None:
+            removed = self._model.removed
+            self._cnames = [name for name in self._base.cnames if name not in removed]
+            self._cnames += [name for name in self._model.added if not self._in_base(name)]
+        return self._cnames
+
+
+    @property
+    def rnames(self):
+        if self._rnames is None:
+            self._rnames = list(self._base.rnames)
+            known = set(self._rnames)
+            for reaction in self._model.added.values():
+                for metabolite in reaction.StoMat:
+                    if metabolite not in known:
+                        known.add(metabolite)
+                        self._rnames.append(metabolite)
+        return self._rnames
+
+
+    def _reaction(self, name):
+        "The added reaction called name, None if it is a reaction of the base model. Raises KeyError if removed."
+        added = self._model.added.get(name)
+        if added is None and name in self._model.removed:
+            raise KeyError(f"Reaction removed from egg: {name}")
+        return added
+
+
+    def InvolvedWith(self, name):
+        """Returns the stoichiometry of a reaction, or the reactions a metabolite takes part in, as a dict."""
+        if name in self._model.added or name in self._model.removed:
+            return dict(self._reaction(name).StoMat)
+        in_base = self._in_base(name)
+        if in_base:
+            return self._base.InvolvedWith(name)
+
+        involved = {}
+        if in_base is False:
+            involved = {reaction : coefficient for reaction, coefficient in self._base.InvolvedWith(name).items()
+                        if reaction not in self._model.removed and reaction not in self._model.added}
+        for reaction in self._model.added.values():
+            if name in reaction.StoMat:
+                involved[reaction.name] = reaction.StoMat[name]
+        return involved
+
+
+    def Reactants(self, reaction):
+        """Returns the substrates of a reaction."""
+        added = self._reaction(reaction)
+        if added is None:
+            return self._base.Reactants(reaction)
+        return [metabolite for metabolite, coefficient in added.StoMat.items() if coefficient < 0]
+
+
+    def Products(self, reaction):
+        """Returns the products of a reaction."""
+        added = self._reaction(reaction)
+        if added is None:
+            return self._base.Products(reaction)
+        return [metabolite for metabolite, coefficient in added.StoMat.items() if coefficient > 0]
+
+
+    def ReacToStr(self, reaction):
+        """Returns a reaction in ScrumPy format."""
+        added = self._reaction(reaction)
+        if added is None:
+            return self._base.ReacToStr(reaction)
+
+        def side(sign):
+            terms = []
+            for metabolite, coefficient in added.StoMat.items():
+                if coefficient * sign > 0:
+                    terms.append((f"{abs(coefficient)} " if abs(coefficient) != 1 else "") + f'"{metabolite}"')
+            return " + ".join(terms)
+        return f"{added.name}:\n    {side(-1)} {added.direction} {side(1)}\n    ~\n"
+
+
+    def Connectedness(self, metabolite):
+        """Returns the number of reactions a metabolite takes part in."""
+        return len(self.InvolvedWith(metabolite))
+
+
+    def NewReaction(self, name, StoMat, direction):
+        """Adds a reaction to the egg (not to the base model)."""
+        self._model.add_reaction(name, StoMat, direction)
+
+
+class DeltaModel:
+
+    """
+    An egg represented as its base model plus the reactions it adds and removes.
+
+    The base model is shared and keeps its reactions: reactions added or removed through the delta
+    model, its sm and smx views included, only change the delta. Data attributes are read from the
+    base model. Methods (such as GetLP or DeadReactions) and the model description (md) belong to
+    a materialised copy, so they see the delta and can't change the base model, see materialise.
+
+    ...
+    Parameters:
+        base (obj) : ScrumPy model
+        reactions (iterable) : reactions to add, as (name, StoMat, direction) (see hatcher._parse_file)
+        removals (iterable) : IDs of reactions to remove
+
+    Attributes
+    ----------
+    base : obj
+        The base model
+
+    added : dict
+        key : reaction name
+        value : (name, StoMat, direction)
+
+    removed : dict
+        Reactions removed from the base model, in the order they were removed (values are None)
+
+    Methods
+    -------
+        DelReactions(reactions)
+        add_reaction(name, StoMat, direction)
+        materialise()
+        GetLP()
+        Init()
+
+    """
+
+    def __init__(self, base, reactions=(), removals=()):
+        self.base = base
+        self.added = {reaction.name : reaction for reaction in reactions}
+        self.removed = dict.fromkeys(removals)
+        self._views = {}
+        self._materialised = None
+
+
+    def __repr__(self):
+        return f"DeltaModel: {len(self.added)} reactions added and {len(self.removed)} removed from {self.base!r}"
+
+
+    def __getattr__(self, attr):
+        if attr.startswith("_") or attr in ("base", "added", "removed"):
+            raise AttributeError(attr)
+        value = getattr(self.base, attr)
+        if attr == "md" or callable(value):
+            return getattr(self.materialise(), attr)
+        return value
+
+
+    def _view(self, matrix):
+        if matrix not in self._views:
+            self._views[matrix] = DeltaStoMat(self, matrix)
+        return self._views[matrix]
+
+
+    @property
+    def sm(self):
+        return self._view("sm")
+
+
+    @property
+    def smx(self):
+        return self._view("smx")
+
+
+    def _changed(self):
+        self._views = {}
+        self._materialised = None
+
+
+    def DelReactions(self, reactions):
+        """Removes reactions from the egg."""
+        for reaction in reactions:
+            if self.added.pop(reaction, None) is None or self.sm._in_base(reaction):                # reactions only added by the egg are just dropped
+                self.removed[reaction] = None
+        self._changed()
+
+
+    def add_reaction(self, name, StoMat, direction):
+        """Adds a reaction to the egg."""
+        self.removed.pop(name, None)
+        self.added[name] = StoDict(name, dict(StoMat), direction)
+        self._changed()
+
+
+    def Init(self):
+        """Views are composed when next used; the base model is not initialised again."""
+        self._changed()
+
+
+    def materialise(self):
+        """
+        Returns a complete model of the egg, made as hatch makes one: the delta is applied to a
+        copy of the base model, which takes over the base model's matrices, and the base model is
+        initialised again to rebuild its own. The copy is kept until the delta changes.
+        """
+        if self._materialised is None:
+            from .hatcher import _apply, _new_egg
+            self._materialised = _apply(_new_egg(self.base), (tuple(self.added.values()), tuple(self.removed)))
+            self.base.Init()
+        return self._materialised
+
+
+    def GetLP(self):
+        """Returns the LP of the materialised model."""
+        return self.materialise().GetLP()
+
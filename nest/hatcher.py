@@ -5,18 +5,28 @@ Egg handling module for tuatara.
 
 Functions:
 
-    hatch(m, egg)           -> model
+    hatch(m, egg, egg_dir=None, delta=False) -> model
+    hatch_many(m, eggs, egg_dir=None, fromspy=False, lazy=False, workers=1, failed=None) -> list|generator
+    compile_egg(egg_path, lines=None) -> tuple
 
 """
 
 
+import logging
 import re
 from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from itertools import zip_longest
+from os import path
 
-from ..core.GUI import _ask_spy_file
 from ..tools.utils import dequote, remove_prefix
-from .keeper import get_path
+from .cache import egg_cache
+from .compiled import StoDict, compiled_path, read_compiled, read_source, source_stamp, write_compiled
+from .delta import DeltaModel
+from .keeper import DIR, get_path, lock, open_egg, resolve
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
 
 
 def _new_egg(obj):
@@ -101,67 +111,217 @@ class _Parser:
     def return_StoMat(self) -> namedtuple: return self.StoDict(self._name, self._StoMat, self._direction)
 
 
-def _parse_file(egg_path):
-    """Parses the .spy file into usable forms which can be added to or removed from model."""
+def _parse_lines(f):
+    """Parses the lines of a .spy file into usable forms which can be added to or removed from model."""
     egg_reactions = []
     remove_list = []
 
     parse = _Parser()
-    with open(egg_path, 'r') as f:
+    try:
+        while True:
+            line = next(f)
+            line = line.strip()
+            if line and not line.startswith('#'):
+                if line[1:4] == "rm_":
+                    reacID = remove_prefix(line[:-1])
+                    reacID = dequote(reacID)
+                    remove_list.append(reacID)
+                    _ = next(f)
+                    _ = next(f)
+
+                elif ":" in line:
+                    parse._name = line[:-1]
+                    parse.to_SD(next(f))
+                    egg_reactions.append(parse.return_StoMat())
+                    _ = next(f)
+                    parse.__init__()
+
+    except StopIteration:
+        return egg_reactions, remove_list
+
+
+def _parse_file(egg_path):
+    """Parses the .spy file into usable forms which can be added to or removed from model."""
+    with open_egg(egg_path) as f:
+        return _parse_lines(f)
+
+
+def compile_egg(egg_path, lines=None):
+    """
+    Writes the compiled egg (.spyc) of a .spy file, see compiled.py.
+    An alias is compiled as the egg holding its contents, so eggs are only ever compiled as themselves.
+
+        Parameters:
+            egg_path (str) : .spy or .spy.gz file path
+            lines (iterable) : the lines of the .spy file, if already in memory (default: read egg_path)
+
+        Returns:
+            contents (tuple) : (reactions, removals)
+    """
+    if lines is None:
+        egg_path = resolve(egg_path)
+    contents = _parse_lines(iter(lines)) if lines is not None else _parse_file(egg_path)
+    write_compiled(compiled_path(egg_path), contents, source_stamp(egg_path))
+    return contents
+
+
+def _read_egg(egg_path):
+    """
+    Reads an egg from its compiled egg when there is one, see compiled.py.
+    A compiled egg older than its .spy file is compiled again.
+    """
+    compiled = compiled_path(egg_path)
+    if not path.isfile(compiled):
+        return _parse_file(egg_path)
+
+    contents = read_compiled(compiled, source_stamp(egg_path))
+    if contents is None:
         try:
-            while True:
-                line = next(f)
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    if line[1:4] == "rm_":
-                        reacID = remove_prefix(line[:-1])
-                        reacID = dequote(reacID)
-                        remove_list.append(reacID)
-                        _ = next(f)
-                        _ = next(f)
-
-                    elif ":" in line:
-                        parse._name = line[:-1]
-                        parse.to_SD(next(f))
-                        egg_reactions.append(parse.return_StoMat())
-                        _ = next(f)
-                        parse.__init__()
-
-        except StopIteration:
-            return egg_reactions, remove_list
-
-
-def hatch(model, egg=None, fromspy=False):
+            contents = compile_egg(egg_path)
+        except OSError:                                                                             # read-only nest
+            contents = _parse_file(egg_path)
+    return contents
+
+
+def hatch(model, egg=None, fromspy=False, egg_dir=None, delta=False):
     """
     Load an egg into the model.
+    Eggs are read from their compiled egg (.spyc) when there is one, and parsed eggs are kept in
+    tuatara.egg_cache, so an egg is only read again once its file changes.
 
         Parameters:
             model (obj) : model
             egg (str) : egg ID
-            fromspy (bool|str) : open file explorer to select .spy file or open file path
+            fromspy (bool|str) : open file explorer to select .spy file or open file path (.spy or .spy.gz)
+            egg_dir (str) : directory egg is kept in (default: tuatara/nest/eggs)
+            delta (bool) : return a DeltaModel, the model plus the egg's changes, leaving the model untouched
 
         Returns:
             model (obj) : model of egg
     """
     if egg:
-        egg_path = get_path(egg)
+        egg_path = get_path(egg, directory=egg_dir or DIR)
     elif isinstance(fromspy, str):
         egg_path = fromspy
     elif fromspy:
+        from ..core.GUI import _ask_spy_file                                                        # tkinter is only loaded when needed
         egg_path = _ask_spy_file()
     else:
         raise ValueError("Expected egg or fromspy argument.")
 
-    reactions, removals = _parse_file(egg_path)
-    new_model = _new_egg(model)
-    new_model.DelReactions(removals)
+    contents = _contents(egg_path, directory=(egg_dir or DIR) if egg else None)
+    if delta:
+        return DeltaModel(model, *contents)
+    new_model = _apply(_new_egg(model), contents)
+    model.Init()
+    return new_model
+
+
+def hatch_many(model, eggs, egg_dir=None, fromspy=False, lazy=False, workers=1, failed=None):
+    """
+    Load many eggs from the same model as DeltaModels, which share the model and hold only each
+    egg's changes, so the model is neither copied nor initialised for each egg as with hatch.
+    A complete model of an egg is only made (as hatch makes one) when something needs it, see
+    DeltaModel.materialise. With workers > 1 eggs are read in a process pool and sent back as
+    their reactions and removals (ScrumPy models can't be pickled).
+
+        Parameters:
+            model (obj) : model
+            eggs (list) : egg IDs, or file paths (.spy or .spy.gz) if fromspy is True
+            egg_dir (str) : directory eggs are kept in (default: tuatara/nest/eggs)
+            fromspy (bool) : eggs are file paths
+            lazy (bool) : return a generator hatching each egg as it is needed
+            workers (int) : number of processes used to read eggs (default: 1, serial)
+            failed (dict) : if given, eggs which can't be read are logged, added to failed
+                (key : egg, value : exception) and left out, instead of raising
+
+        Returns:
+            models (list|generator) : DeltaModel of each egg, in the order of eggs
+    """
+    eggs = list(eggs)
+    directory = egg_dir or DIR
+    paths = [egg if fromspy else get_path(egg, directory=directory) for egg in eggs]
+    directory = None if fromspy else directory
+    models = (DeltaModel(model, *egg_contents) for egg_contents in _read_eggs(eggs, paths, directory, workers, failed))
+    return models if lazy else list(models)
+
+
+def _try_contents(egg_path, directory=None):
+    "Returns (contents, None), or (None, exception) if the egg can't be read."
+    try:
+        return _contents(egg_path, directory=directory), None
+    except Exception as error:
+        return None, error
+
+
+def _read_worker(egg_path, directory):
+    "Reads a single egg inside a worker process; reactions are sent back as picklable StoDicts."
+    contents, error = _try_contents(egg_path, directory=directory)
+    if contents is not None:
+        reactions, removals = contents
+        contents = tuple(StoDict(*reaction) for reaction in reactions), tuple(removals)
+    return contents, error
+
+
+def _read_eggs(eggs, paths, directory, workers, failed):
+    """
+    Yields the contents of each egg in the order of eggs, reading them in a process pool when workers > 1.
+    Eggs which can't be read raise, or are logged and added to failed when it is a dict.
+    """
+    def collect(results):
+        for egg, (contents, error) in zip(eggs, results):
+            if error is None:
+                yield contents
+            elif failed is None:
+                raise error
+            else:
+                log.error(f"Failed to hatch {egg}: {error!r}")
+                failed[egg] = error
+
+    if workers > 1 and len(paths) > 1:
+        workers = min(workers, len(paths))
+        log.info(f"Reading {len(paths)} eggs using {workers} workers.")
+        chunksize = max(1, len(paths) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            yield from collect(pool.map(_read_worker, paths, [directory] * len(paths), chunksize=chunksize))
+    else:
+        yield from collect(_try_contents(egg_path, directory=directory) for egg_path in paths)
+
+
+def _resolve(egg_path):
+    """
+    Follows an alias (see keeper.resolve). An egg with an up to date compiled egg isn't an alias,
+    as aliases are never compiled, so its .spy file isn't read.
+    """
+    compiled = compiled_path(egg_path)
+    if path.isfile(compiled) and read_source(compiled) == source_stamp(egg_path):
+        return egg_path
+    return resolve(egg_path)
+
+
+def _contents(egg_path, directory=None):
+    """
+    Returns the reactions and removals of an egg file (see egg_cache). Aliases are followed
+    through egg_cache too, so a cached or compiled egg is hatched without reading its .spy file.
+    Eggs in an egg directory are read under its shared lock, not while a builder is replacing the egg or its alias.
+    """
+    if directory is None:
+        return egg_cache.get(egg_cache.resolve(egg_path, _resolve), _read_egg)
+    with lock(directory, shared=True):
+        return egg_cache.get(egg_cache.resolve(egg_path, _resolve), _read_egg)
+
+
+def _apply(new_model, contents):
+    "Removes and adds the reactions of an egg to a copy of the model."
+    reactions, removals = contents
+    new_model.DelReactions(list(removals))
     for reaction in reactions:
+        StoMat = dict(reaction.StoMat)                                                              # the cached egg is shared with later hatches
         try:
-            new_model.sm.NewReaction(reaction.name, reaction.StoMat, reaction.direction)
-            new_model.smx.NewReaction(reaction.name, reaction.StoMat, reaction.direction)
+            new_model.sm.NewReaction(reaction.name, StoMat, reaction.direction)
+            new_model.smx.NewReaction(reaction.name, StoMat, reaction.direction)
         except TypeError:
             continue
-    model.Init()
     return new_model
 
 
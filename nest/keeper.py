@@ -6,11 +6,21 @@ Performs maintenance of the nest, attribute management and core nest functions.
 
 """
 
+import gzip
+import json
 import logging
+import os
 import pickle
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime
 from os import path, listdir, remove
 
+try:
+    import fcntl
+except ImportError:                                                                                 # not available on Windows, writes are still atomic
+    fcntl = None
+
 #TODO: finish this -> is it needed?
 
 log = logging.getLogger(__name__)
@@ -20,16 +30,225 @@ DIR = path.join(
     path.dirname(path.realpath(__file__)),
     "eggs")
 
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
 
-def get_path(egg : str) -> str:
-    """Takes egg ID and returns its filepath"""
-    egg_path = path.join(DIR, egg if egg.endswith(".spy") else f"{egg}.spy")
+def get_path(egg : str, directory=DIR) -> str:
+    """Takes egg ID and returns its filepath. Compressed eggs (.spy.gz) are used when there is no .spy file."""
+    if egg.endswith((".spy", ".spy.gz")):
+        return path.join(directory, egg)
+    egg_path = path.join(directory, f"{egg}.spy")
+    if not path.isfile(egg_path) and path.isfile(egg_path + ".gz"):
+        return egg_path + ".gz"
     return egg_path
 
 
-def check_eggsdir_exists() -> bool: return path.isdir(DIR)
+def open_egg(egg_path : str):
+    """Opens an egg's .spy or .spy.gz file for reading as text"""
+    if egg_path.endswith(".gz"):
+        return gzip.open(egg_path, 'rt')
+    return open(egg_path, 'r')
+
+
+def check_eggsdir_exists(directory=DIR) -> bool: return path.isdir(directory)
+
+def check_egg_exists(egg:str, directory=DIR) -> bool: return path.isfile(get_path(egg, directory=directory))
+
+
+# Lock file held while eggs are published to (exclusive) or read from (shared) an egg directory,
+# so builders and readers sharing a directory never see an alias or manifest out of step with its eggs.
+LOCK = ".lock"
+
+
+@contextmanager
+def lock(directory=DIR, shared=False):
+    """
+    Holds the lock file of an egg directory.
+
+        Parameters:
+            directory (str) : egg directory
+            shared (bool) : take a shared (reader) lock instead of an exclusive (writer) lock
+    """
+    try:
+        f = open(path.join(directory, LOCK), "a")
+    except OSError:                                                                                 # read-only directory, nothing can be written to it
+        yield
+        return
+    with f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def mkstemp(directory, prefix=None):
+    """
+    Creates a temporary file in directory to be renamed over another file, see tempfile.mkstemp.
+    mkstemp makes files only their owner can read, so the file is given the permissions open()
+    would (0o666 less the umask) to keep replaced files readable by other users.
+
+        Returns:
+            fd (int), tmp (str) : file descriptor and path of the temporary file
+    """
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=prefix, suffix=".tmp")
+    os.chmod(tmp, 0o666 & ~_UMASK)
+    return fd, tmp
+
+
+@contextmanager
+def atomic_write(fp, compress=False):
+    """
+    Opens a temporary file next to fp for writing text. When the block completes, the file
+    replaces fp with an atomic rename (under the directory's lock), so fp is never seen half written.
+    Nothing is written if the block raises.
+
+        Parameters:
+            fp (str) : file path
+            compress (bool) : gzip the file
+    """
+    directory, name = path.split(fp)
+    fd, tmp = mkstemp(directory, prefix=f".{name}.")
+    try:
+        if compress:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                yield f
+        else:
+            with os.fdopen(fd, 'w') as f:
+                yield f
+        with lock(directory):
+            os.replace(tmp, fp)
+    except BaseException:
+        if path.isfile(tmp):
+            remove(tmp)
+        raise
+
+
+# Eggs with the same contents as another egg are stored as a small alias file
+# which names the egg holding the contents (the payload).
+ALIAS = "# Alias of: "
+
+
+def write_alias(egg : str, payload : str, directory=DIR):
+    """Writes egg as an alias of payload"""
+    with atomic_write(path.join(directory, f"{egg}.spy")) as f:
+        f.write("# This file was made with the tuatara package.\n"
+                f"# Egg ID: {egg}\n"
+                f"{ALIAS}{payload}\n")
+    remove_stale(egg, compressed=False, directory=directory)
+
+
+def remove_stale(egg : str, compressed : bool, directory=DIR):
+    """Removes the other variant of an egg (.spy.gz if compressed is False, otherwise .spy)."""
+    stale = path.join(directory, f"{egg}.spy" if compressed else f"{egg}.spy.gz")
+    with lock(directory):
+        if path.isfile(stale):
+            remove(stale)
+
+
+def read_alias(egg_path : str):
+    """Returns the payload egg ID if egg_path is an alias, otherwise None."""
+    with open_egg(egg_path) as f:
+        for line in f:
+            if line.startswith(ALIAS):
+                return line[len(ALIAS):].strip()
+            if not line.startswith("#"):
+                return None
+    return None
+
+
+def resolve(egg_path : str) -> str:
+    """Follows an alias to the .spy file holding its contents. Other files are returned as they are."""
+    payload = read_alias(egg_path)
+    if payload is None:
+        return egg_path
+    return get_path(payload, directory=path.dirname(egg_path))
+
+
+class Manifest:
 
-def check_egg_exists(egg:str) -> bool: return path.isfile(path.join(DIR, f"{egg}.spy"))
+    """
+    A record of the inputs each egg was built from, kept as manifest.json in the nest.
+    A rebuild can skip an egg whose input digest is unchanged and whose .spy file is as it was written.
+    Saving merges the eggs recorded since the manifest was read into the manifest on disk,
+    so builds writing different eggs to the same directory don't drop each other's entries.
+
+    ...
+    Parameters:
+        directory (str) : egg directory (default: tuatara/nest/eggs)
+
+    Methods
+    -------
+        unchanged(egg, digest)
+        statement(egg)
+        record(egg, digest, statement)
+        save()
+
+    """
+
+    def __init__(self, directory=DIR):
+        self._directory = directory
+        self._path = path.join(directory, "manifest.json")
+        self.entries = self._read()
+        self._recorded = set()
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    def _read(self):
+        try:
+            with open(self._path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            log.warning("Nest manifest is unreadable, all eggs will be rebuilt.")
+            return {}
+
+
+    def _stat(self, egg):
+        stat = os.stat(get_path(egg, directory=self._directory))
+        return [stat.st_size, stat.st_mtime_ns]
+
+
+    def unchanged(self, egg, digest) -> bool:
+        """True if egg was built from the same inputs and its file hasn't been modified since."""
+        entry = self.entries.get(egg)
+        if not entry or entry["digest"] != digest:
+            return False
+        try:
+            return self._stat(egg) == entry["file"]
+        except FileNotFoundError:
+            return False
+
+
+    def statement(self, egg) -> str: return self.entries[egg]["statement"]
+
+
+    def record(self, egg, digest, statement):
+        """Records a newly written egg."""
+        self.entries[egg] = {
+            "digest" : digest,
+            "file" : self._stat(egg),
+            "statement" : statement
+        }
+        self._recorded.add(egg)
+
+
+    def save(self):
+        with lock(self._directory):
+            entries = self._read()
+            entries.update({egg : self.entries[egg] for egg in self._recorded})
+            fd, tmp = mkstemp(self._directory)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f, indent=1)
+            os.replace(tmp, self._path)
+        self.entries = entries
 
 
 class RegisterManager:
@@ -126,10 +345,22 @@ class RegisterManager:
 
 class Eggs(RegisterManager):
 
-    def __init__(self):
+    def __init__(self, directory=DIR):
         super().__init__()
 
-        self.eggs = [egg for egg in listdir(DIR) if egg.endswith(".spy")]
+        self.directory = directory
+        self.eggs = [egg for egg in listdir(directory) if egg.endswith((".spy", ".spy.gz"))]
+
+
+    @property
+    def aliases(self):
+        """Eggs stored as an alias of another egg; {alias : payload}"""
+        aliases = {}
+        for egg in self.eggs:
+            payload = read_alias(path.join(self.directory, egg))
+            if payload:
+                aliases[egg[:egg.rindex(".spy")]] = payload
+        return aliases
 
 
     def __len__(self):
@@ -1,11 +1,29 @@
+from importlib import import_module
 
-from .watchlist import WatchList, scan
-from .tuakit import (
-                    LP,
-                    Model, 
-                    DataBases, 
-                    ATP
-                    )
-from .utils import (
-                    HidePrints
-                    )
+# imported on first use so building a nest doesn't load tkinter or the plotting libraries (see tuatara/__init__.py)
+_exports = {
+    "WatchList" :  ".watchlist",
+    "scan" :       ".watchlist",
+    "LP" :         ".tuakit",
+    "Model" :      ".tuakit",
+    "DataBases" :  ".tuakit",
+    "ATP" :        ".tuakit",
+    "HidePrints" : ".utils"
+}
+
+
+def __getattr__(name):
+    try:
+        module = _exports[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
+
+
+__all__ = list(_exports)
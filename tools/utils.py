@@ -13,6 +13,7 @@ Functions:
     list_identical(list_a, list_b)      -> bool
     str_identical(str_a, str_b)         -> bool
     split_reaction(reaction)            -> namedtuple
+    canonical_reaction(reaction)        -> tuple
     add_prefix(reaction, prefix='tua_') -> str
     remove_prefix(reaction)             -> str
     str_len(value)                      -> str
@@ -23,8 +24,9 @@ Functions:
 
 import re
 import sys
-from collections import namedtuple
+from collections import Counter, namedtuple
 from collections.abc import Iterable
+from functools import lru_cache
 from os import devnull
 
 
@@ -79,6 +81,26 @@ def split_reaction(reaction):
     return Reaction(substrates, direction[0], products)
 
 
+@lru_cache(maxsize=None)
+def canonical_reaction(reaction):
+    """
+    Returns a hashable form of a ScrumPy reaction that ignores the order of
+    substrates and products, so two reactions are identical if their canonical forms are equal.
+    Results are memoised per reaction string; call canonical_reaction.cache_clear() to release them.
+
+        Parameters:
+            Reaction (str) : A ScrumPy reaction
+
+        Returns:
+            Reaction (tuple):
+                (frozenset) substrates with their counts
+                (string)    direction
+                (frozenset) products with their counts
+    """
+    substrates, direction, products = split_reaction(reaction)
+    return frozenset(Counter(substrates).items()), direction, frozenset(Counter(products).items())
+
+
 def add_prefix(reaction: str, prefix="rm_") -> str:
     """
     Adds the prefix notation for tuatara reactions.
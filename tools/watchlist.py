@@ -18,7 +18,7 @@ from os import path, remove
 from flashtext import KeywordProcessor
 
 from ..core.GUI import Editor, Scanner, _ask_spy_file
-from ..nest.keeper import get_path
+from ..nest.keeper import get_path, open_egg, resolve
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
@@ -237,7 +237,8 @@ class scan(WatchList):
 
         gui = Scanner(egg if egg else egg_path)
 
-        for line, reaction in enumerate(open(egg_path).readlines(), start=1):
+        egg_path = resolve(egg_path)                                                                # an alias is scanned through the egg holding its contents
+        for line, reaction in enumerate(open_egg(egg_path).readlines(), start=1):
             if reaction and not reaction.startswith('#'):
                 match = keyword_processor.extract_keywords(reaction)
                 if match: